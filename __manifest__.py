@@ -1,6 +1,6 @@
 {
     'name': 'Wave Money Payment',
-    'version': '1.0',
+    'version': '1.4',
     'summary': 'Intégration Wave et Orange Money pour les paiements',
     'description': 'Permet de générer des liens de paiement Wave et Orange Money et de suivre les transactions.',
     'category': 'CCBM/',
@@ -18,11 +18,16 @@
     'images': ['static/description/icon.png'],
     'data': [
         'security/ir.model.access.csv',
+        'data/wave_cron.xml',
 
         'views/wave_config_views.xml',
         'views/wave_transaction_views.xml',
+        'views/wave_transaction_archive_views.xml',
+        'views/wave_webhook_event_views.xml',
+        'views/wave_webhook_dead_letter_views.xml',
 
         'views/wave_menu.xml',
+        'views/wave_receipt_templates.xml',
         
         'views/sale_order_view.xml',
         # 'views/sale_order_payment_view.xml',
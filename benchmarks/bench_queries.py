@@ -0,0 +1,191 @@
+"""Banc d'essai des requêtes du module sur la table wave_transaction.
+
+Crée un schéma temporaire contenant une copie synthétique de la table
+(colonnes interrogées, index posés par l'ORM), la remplit, puis relève
+pour chaque requête des routes et des crons le plan EXPLAIN et le temps
+médian, d'abord sans puis avec les index de tools/wave_indexes.py
+(et les index de champs listés dans FIELD_INDEXES).
+Le schéma est supprimé à la fin. Nécessite psycopg2 ; à lancer hors d'Odoo :
+
+    python benchmarks/bench_queries.py --dsn "dbname=bench" --rows 1000000 --json results.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import time
+
+import psycopg2
+
+SCHEMA = 'wave_bench'
+
+# Index créés par l'ORM (champs index=True et contraintes d'unicité)
+ORM_INDEXES = [
+    ('wave_transaction__wave_id_index', ['wave_id'], ''),
+    ('wave_transaction__transaction_id_index', ['transaction_id'], ''),
+    ('wave_transaction__reference_index', ['reference'], ''),
+    ('wave_transaction__status_index', ['status'], ''),
+]
+
+# Index de champs (index=True) introduits avec ceux de tools/wave_indexes.py :
+# mesurés avec eux, donc absents de la référence
+FIELD_INDEXES = [
+    ('wave_transaction__order_id_index', ['order_id'], ''),
+]
+
+# Requêtes du module : (nom, SQL, fonction de paramètres)
+QUERIES = [
+    ('partner_history',
+     "SELECT id FROM wave_transaction WHERE partner_id = %s ORDER BY created_at DESC LIMIT 80",
+     lambda args: (args.partners // 2,)),
+    ('partner_count',
+     "SELECT count(*) FROM wave_transaction WHERE partner_id = %s",
+     lambda args: (args.partners // 2,)),
+    ('expire_stale_pending',
+     "SELECT id FROM wave_transaction WHERE status = 'pending' AND created_at < now() - interval '60 minutes'",
+     lambda args: ()),
+    ('by_order',
+     "SELECT id FROM wave_transaction WHERE order_id = %s",
+     lambda args: (args.rows // 3,)),
+    ('by_wave_id',
+     "SELECT id FROM wave_transaction WHERE wave_id = %s",
+     lambda args: (f"cos-{args.rows // 2}",)),
+    ('by_transaction_id',
+     "SELECT id FROM wave_transaction WHERE transaction_id = %s",
+     lambda args: (f"TX-{args.rows // 2}",)),
+    ('default_listing',
+     "SELECT id FROM wave_transaction ORDER BY created_at DESC LIMIT 80",
+     lambda args: ()),
+]
+
+
+def _load_module_indexes():
+    """Charger tools/wave_indexes.py sans importer le paquet (qui dépend d'Odoo)"""
+    path = os.path.join(os.path.dirname(__file__), os.pardir, 'tools', 'wave_indexes.py')
+    spec = importlib.util.spec_from_file_location('wave_indexes', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.TRANSACTION_INDEXES
+
+
+def _create_indexes(cr, indexes):
+    for name, expressions, where in indexes:
+        cr.execute(f"CREATE INDEX {name} ON wave_transaction ({', '.join(expressions)})"
+                   + (f" WHERE {where}" if where else ""))
+    cr.execute("ANALYZE wave_transaction")
+
+
+def _drop_indexes(cr, indexes):
+    for name, expressions, where in indexes:
+        cr.execute(f"DROP INDEX IF EXISTS {name}")
+    cr.execute("ANALYZE wave_transaction")
+
+
+def seed(cr, args):
+    """Créer et remplir la table synthétique"""
+    cr.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cr.execute(f"CREATE SCHEMA {SCHEMA}")
+    cr.execute(f"SET search_path TO {SCHEMA}")
+    cr.execute("""
+        CREATE TABLE wave_transaction (
+            id serial PRIMARY KEY,
+            wave_id varchar NOT NULL,
+            transaction_id varchar NOT NULL,
+            reference varchar NOT NULL,
+            amount numeric NOT NULL,
+            status varchar NOT NULL,
+            checkout_status varchar,
+            payment_status varchar,
+            order_id integer,
+            partner_id integer,
+            created_at timestamp NOT NULL,
+            updated_at timestamp,
+            completed_at timestamp
+        )
+    """)
+    # Historique de deux ans ; 2 % des transactions encore en attente
+    cr.execute("""
+        INSERT INTO wave_transaction (wave_id, transaction_id, reference, amount, status, checkout_status,
+                                      payment_status, order_id, partner_id, created_at, updated_at, completed_at)
+        SELECT 'cos-' || g, 'TX-' || g, 'REF-' || g, (random() * 500000)::int,
+               CASE WHEN random() < 0.02 THEN 'pending' WHEN random() < 0.85 THEN 'completed' ELSE 'expired' END,
+               'complete', 'succeeded',
+               CASE WHEN random() < 0.9 THEN g / 3 END,
+               (random() * %(partners)s)::int,
+               ts, ts, ts + interval '2 minutes'
+          FROM generate_series(1, %(rows)s) AS g,
+               LATERAL (SELECT now() - random() * interval '730 days' AS ts) AS t
+    """, {'rows': args.rows, 'partners': args.partners})
+    _create_indexes(cr, ORM_INDEXES)
+
+
+def measure(cr, args, label):
+    """Relever plan et temps médian de chaque requête"""
+    results = {}
+    for name, query, params in QUERIES:
+        values = params(args)
+        cr.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, values)
+        plan = cr.fetchone()[0][0]
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            cr.execute(query, values)
+            cr.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'plan_node': plan['Plan']['Node Type'],
+            'index': plan['Plan'].get('Index Name') or _first_index(plan['Plan']),
+            'shared_hit_blocks': plan['Plan'].get('Shared Hit Blocks'),
+            'plan': plan,
+        }
+        print(f"{label:<12} {name:<22} {results[name]['median_ms']:>10.3f} ms  "
+              f"{results[name]['plan_node']:<18} {results[name]['index'] or '-'}")
+    return results
+
+
+def _first_index(node):
+    """Premier index utilisé dans un plan (nœuds imbriqués compris)"""
+    if node.get('Index Name'):
+        return node['Index Name']
+    for child in node.get('Plans', ()):
+        name = _first_index(child)
+        if name:
+            return name
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', required=True, help="Chaîne de connexion PostgreSQL (base de test)")
+    parser.add_argument('--rows', type=int, default=500000, help="Nombre de transactions synthétiques")
+    parser.add_argument('--partners', type=int, default=20000, help="Nombre de clients distincts")
+    parser.add_argument('--repeat', type=int, default=20, help="Exécutions par requête pour le temps médian")
+    parser.add_argument('--json', help="Fichier où enregistrer plans et temps")
+    parser.add_argument('--keep', action='store_true', help="Conserver le schéma de test")
+    args = parser.parse_args()
+
+    module_indexes = _load_module_indexes() + FIELD_INDEXES
+    connection = psycopg2.connect(args.dsn)
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cr:
+            print(f"Remplissage de {args.rows} transactions...")
+            seed(cr, args)
+            _drop_indexes(cr, module_indexes)
+            baseline = measure(cr, args, 'sans index')
+            _create_indexes(cr, module_indexes)
+            indexed = measure(cr, args, 'avec index')
+            if args.json:
+                with open(args.json, 'w') as f:
+                    json.dump({'rows': args.rows, 'partners': args.partners,
+                               'baseline': baseline, 'indexed': indexed}, f, indent=2, default=str)
+            if not args.keep:
+                cr.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Banc d'essai du rendu des reçus Wave : moteur PDF natif contre wkhtmltopdf.
+
+Rend ``--count`` reçus synthétiques avec tools/receipt_pdf.py, puis les
+mêmes reçus en HTML (feuille de style du module) avec le binaire
+wkhtmltopdf, un processus par reçu comme ir.actions.report, et en lots de
+``--batch`` documents. Relève le débit (reçus par seconde), la latence
+médiane et la mémoire (pic tracemalloc et RSS maximal des processus
+wkhtmltopdf). À lancer hors d'Odoo :
+
+    python benchmarks/bench_receipt_pdf.py --count 200 --logo logo.png --json results.json
+"""
+import argparse
+import html
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def _load_renderer():
+    """Charger tools/receipt_pdf.py sans importer le paquet (qui dépend d'Odoo)"""
+    path = os.path.join(ROOT, 'tools', 'receipt_pdf.py')
+    spec = importlib.util.spec_from_file_location('receipt_pdf', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_receipts(count, logo):
+    """Reçus synthétiques, structure de wave.transaction._get_receipt_values()"""
+    return [{
+        'title': 'FACTURE DE PAIEMENT',
+        'reference': f"REF-{index}",
+        'logo': logo,
+        'company_name': 'CCBM SHOP',
+        'company': [
+            ('Adresse', 'Dakar, Sénégal'),
+            ('Ville', 'Dakar, Sénégal'),
+            ('Téléphone', '70 922 17 75 | 70 843 04 36'),
+            ('Email', 'shop@ccbm.sn'),
+            ('Site Web', 'www.ccbmshop.sn'),
+        ],
+        'invoice': [
+            ('Numéro de facture', f"WAVE-{index:06d}"),
+            ('Date de paiement', '17/10/2026 12:00:00'),
+            ('Mode de paiement', 'Wave Money'),
+        ],
+        'status': 'PAYÉ',
+        'rows': [
+            ('Transaction ID', f"TX-{index}"),
+            ('Wave ID', f"cos-{index:012d}"),
+            ('Téléphone', '+221770000000'),
+            ('Description', 'Paiement de la commande S%05d via Wave Money' % index),
+            ('Client', 'Client de test'),
+            ('Email Client', 'client@example.com'),
+        ],
+        'total': f"{10000 + index:,.0f} FCFA",
+        'footer': [
+            'Contacts: 70 922 17 75 | 70 843 04 36',
+            'Email: contact@ccbmshop.sn | Web: www.ccbmshop.sn',
+        ],
+    } for index in range(count)]
+
+
+def to_html(receipts, css):
+    """Document HTML équivalent au modèle QWeb wave_receipt_document"""
+    def lines(pairs):
+        return ''.join(f"<p><strong>{html.escape(k)}:</strong> {html.escape(v)}</p>" for k, v in pairs)
+
+    pages = []
+    for receipt in receipts:
+        rows = ''.join(f"<tr><th>{html.escape(k)}</th><td>{html.escape(v)}</td></tr>" for k, v in receipt['rows'])
+        pages.append(f"""
+            <div class="receipt">
+                <div class="header"><div><h2 class="ccbm-branding">{receipt['title']}</h2>
+                <h3>Référence: {html.escape(receipt['reference'])}</h3></div></div>
+                <div class="company-section"><div class="company-info">
+                <h3 class="ccbm-branding">{receipt['company_name']}</h3>{lines(receipt['company'])}</div></div>
+                <div class="invoice-info"><h3>Informations de la facture</h3>{lines(receipt['invoice'])}
+                <p><strong>Statut:</strong> <span class="status-success">{receipt['status']}</span></p></div>
+                <div class="transaction-details"><h3>Détails de la transaction</h3>
+                <table class="table">{rows}</table></div>
+                <div class="total"><p>MONTANT TOTAL PAYÉ: <span class="ccbm-branding">{receipt['total']}</span></p></div>
+                <div class="footer">{''.join(f'<p>{html.escape(line)}</p>' for line in receipt['footer'])}</div>
+            </div>""")
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"/><style>{css}</style></head>"
+            f"<body>{''.join(pages)}</body></html>")
+
+
+def bench_native(renderer, receipts):
+    tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    size = 0
+    for receipt in receipts:
+        start = time.perf_counter()
+        size += len(renderer.render_receipt(receipt))
+        timings.append(time.perf_counter() - start)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'receipts_per_second': round(len(receipts) / sum(timings), 1),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'peak_python_kb': peak // 1024,
+        'rss_growth_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        'average_pdf_bytes': size // len(receipts),
+    }
+
+
+def _run_wkhtmltopdf(binary, html_content, workdir):
+    """Un appel wkhtmltopdf ; retourner (durée, RSS maximal du processus en Ko)"""
+    source = os.path.join(workdir, 'receipt.html')
+    target = os.path.join(workdir, 'receipt.pdf')
+    with open(source, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    start = time.perf_counter()
+    process = subprocess.Popen([binary, '--quiet', '--page-size', 'A4', '-T', '10', '-B', '10', '-L', '10', '-R', '10',
+                                source, target], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _pid, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status:
+        raise RuntimeError(f"wkhtmltopdf a échoué (code {status})")
+    return elapsed, usage.ru_maxrss
+
+
+def bench_wkhtmltopdf(binary, receipts, css, batch):
+    with tempfile.TemporaryDirectory() as workdir:
+        single = [_run_wkhtmltopdf(binary, to_html([receipt], css), workdir) for receipt in receipts]
+        batched = [_run_wkhtmltopdf(binary, to_html(receipts[i:i + batch], css), workdir)
+                   for i in range(0, len(receipts), batch)]
+    return {
+        'single': {
+            'receipts_per_second': round(len(receipts) / sum(t for t, _rss in single), 1),
+            'median_ms': round(statistics.median(t for t, _rss in single) * 1000, 3),
+            'max_rss_kb': max(rss for _t, rss in single),
+        },
+        'batched': {
+            'batch': batch,
+            'receipts_per_second': round(len(receipts) / sum(t for t, _rss in batched), 1),
+            'max_rss_kb': max(rss for _t, rss in batched),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100, help="Nombre de reçus à rendre")
+    parser.add_argument('--batch', type=int, default=20, help="Reçus par appel wkhtmltopdf en mode groupé")
+    parser.add_argument('--logo', help="Logo JPEG ou PNG intégré aux reçus natifs")
+    parser.add_argument('--wkhtmltopdf', default=shutil.which('wkhtmltopdf'), help="Chemin du binaire wkhtmltopdf")
+    parser.add_argument('--json', help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    logo = None
+    if args.logo:
+        with open(args.logo, 'rb') as f:
+            logo = f.read()
+    receipts = make_receipts(args.count, logo)
+    results = {'count': args.count}
+
+    results['native'] = bench_native(_load_renderer(), receipts)
+    print(f"natif        {results['native']['receipts_per_second']:>8} reçus/s  "
+          f"médiane {results['native']['median_ms']} ms  pic Python {results['native']['peak_python_kb']} Ko")
+
+    if args.wkhtmltopdf:
+        with open(os.path.join(ROOT, 'static', 'src', 'css', 'wave_receipt.css'), encoding='utf-8') as f:
+            css = f.read()
+        results['wkhtmltopdf'] = bench_wkhtmltopdf(args.wkhtmltopdf, receipts, css, args.batch)
+        single, batched = results['wkhtmltopdf']['single'], results['wkhtmltopdf']['batched']
+        print(f"wkhtmltopdf  {single['receipts_per_second']:>8} reçus/s  "
+              f"médiane {single['median_ms']} ms  RSS max {single['max_rss_kb']} Ko")
+        print(f"lots de {args.batch:<4} {batched['receipts_per_second']:>8} reçus/s  "
+              f"RSS max {batched['max_rss_kb']} Ko")
+    else:
+        print("wkhtmltopdf introuvable : seul le moteur natif a été mesuré")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
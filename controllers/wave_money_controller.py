@@ -1,18 +1,27 @@
 
 from odoo import http, fields
 from odoo.http import request, Response
-import requests
+from odoo.tools import consteq
 import hmac
 import hashlib
 import json
 import logging
 import werkzeug
 from datetime import datetime
-import base64
+
+from ..tools.rate_limiter import PRIORITY_INITIATE
+from ..tools.single_flight import SingleFlight
+from ..tools.wave_status import can_transition, map_status, raw_statuses
 
 
 _logger = logging.getLogger(__name__)
 
+# Espace de noms des verrous consultatifs PostgreSQL du rafraîchissement de statut
+STATUS_REFRESH_LOCK = 0x57415645
+
+# Regroupement des rafraîchissements concurrents d'une même session dans le worker
+_status_flight = SingleFlight()
+
 class WaveMoneyController(http.Controller):
     
     @http.route('/api/payment/wave/initiate', type='http', auth='public', cors='*', methods=['POST'], csrf=False)
@@ -78,18 +87,8 @@ class WaveMoneyController(http.Controller):
                 "error_url": config.callback_url
             }
 
-            headers = {
-                "Authorization": f"Bearer {config.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            # Appel à l'API Wave checkout sessions
-            response = requests.post(
-                "https://api.wave.com/v1/checkout/sessions", 
-                json=payload, 
-                headers=headers,
-                timeout=30
-            )
+            # Appel à l'API Wave checkout sessions (client partagé du worker)
+            response = config._get_wave_client().post("checkout/sessions", json=payload, priority=PRIORITY_INITIATE)
 
             if response.status_code in [200, 201]:
                 data = response.json()
@@ -149,6 +148,12 @@ class WaveMoneyController(http.Controller):
             # Priorité 1: transaction_id (notre ID personnalisé)
             if transaction_id:
                 transaction = request.env['wave.transaction'].sudo().search([('transaction_id', '=', transaction_id)], limit=1)
+                if not transaction:
+                    # Transaction terminée ancienne : servie depuis l'archive, sans appel Wave
+                    archived = request.env['wave.transaction.archive'].sudo()._lookup(transaction_id=transaction_id)
+                    if archived:
+                        return self._make_response(dict(archived, success=True), 200)
+                    return self._make_response({"error": "Transaction not found"}, 400)
                 result = self._refresh_transaction_status(transaction)
                 if result:
                     transaction_up = request.env['wave.transaction'].sudo().search([('transaction_id', '=', transaction_id)], limit=1)
@@ -204,6 +209,46 @@ class WaveMoneyController(http.Controller):
 
 
     
+    @http.route('/api/payment/wave/archive', type='http', auth='public', cors='*', methods=['GET'])
+    def get_archived_wave_transaction(self, transaction_id=None, wave_id=None, reference=None, **kwargs):
+        """Consulter une transaction Wave archivée (lecture seule)"""
+        try:
+            archived = request.env['wave.transaction.archive'].sudo()._lookup(
+                transaction_id=transaction_id, wave_id=wave_id, reference=reference
+            )
+            if not archived:
+                return self._make_response({'success': False, 'error': 'Archived transaction not found'}, 404)
+            return self._make_response(dict(archived, success=True), 200)
+        except Exception as e:
+            _logger.error(f"Error reading archived Wave transaction: {str(e)}")
+            return self._make_response({'success': False, 'error': str(e)}, 400)
+
+    @http.route('/api/payment/wave/invoice/<int:transaction_id>', type='http', auth='public', methods=['GET'])
+    def download_wave_invoice(self, transaction_id, access_token=None, download=None, **kwargs):
+        """Télécharger la facture PDF d'une transaction payée.
+
+        Le PDF est rendu à la première demande puis conservé en pièce jointe ;
+        il est ensuite servi directement depuis le filestore (ETag, requêtes
+        Range, X-Sendfile lorsque le serveur est configuré pour). Une
+        transaction archivée sert la facture déplacée avec elle dans l'archive.
+        """
+        transaction = request.env['wave.transaction'].sudo().browse(transaction_id).exists()
+        if not transaction:
+            transaction = request.env['wave.transaction.archive'].sudo().search(
+                [('original_id', '=', transaction_id)], limit=1)
+        if not transaction or not access_token \
+                or not consteq(access_token, transaction._get_invoice_access_token()):
+            return request.not_found()
+        try:
+            attachment = transaction._get_invoice_attachment()
+        except Exception as e:
+            _logger.error(f"Error rendering Wave invoice {transaction_id}: {str(e)}")
+            attachment = None
+        if not attachment:
+            return request.not_found()
+        stream = request.env['ir.binary']._get_stream_from(attachment, 'raw')
+        return stream.get_response(as_attachment=bool(download))
+
     @http.route('/api/payment/wave/session/<string:session_id>', type='http', auth='public', cors='*', methods=['GET'])
     def get_wave_session(self, session_id, **kwargs):
         """Récupérer les détails d'une session Wave par son ID"""
@@ -281,6 +326,7 @@ class WaveMoneyController(http.Controller):
             refund_data = config.refund_transaction(session_id)
             
             if refund_data:
+                config.invalidate_session_cache(session_id)
                 # Mettre à jour la transaction
                 transaction.write({
                     'status': 'refunded',
@@ -337,22 +383,28 @@ class WaveMoneyController(http.Controller):
                     # Récupérer les détails de la session depuis Wave
                     config = request.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
                     if config:
-                        session_data = config.get_session_by_id(session_id)
+                        session_data = config.get_session_by_id(session_id, use_cache=False)
                         if session_data:
                             # Mettre à jour le statut selon les données de la session
-                            checkout_status = session_data.get('checkout_status', '').lower()
-                            payment_status = session_data.get('payment_status', '').lower()
-                            odoo_status = self._map_wave_status_to_odoo(checkout_status, payment_status)
+                            odoo_status = self._map_wave_status_to_odoo(*raw_statuses(session_data))
+                            previous_status = transaction.status
+                            # Statuts Wave bruts écrits seulement si la transition est acceptée
+                            raw_vals = transaction._raw_status_vals(session_data)
+                            if not can_transition(previous_status, odoo_status):
+                                _logger.warning(f"Transition {previous_status} -> {odoo_status} refusée pour la transaction {transaction.id}")
+                                odoo_status = previous_status
+                                raw_vals = {}
 
                             transaction.write({
                                 'status': odoo_status,
                                 'updated_at': fields.Datetime.now(),
                                 'wave_response': json.dumps(session_data),
-                                'checkout_status': checkout_status,
-                                'payment_status': payment_status,
+                                **raw_vals,
                             })
-                            # Déclencher les actions selon le statut
-                            if odoo_status == 'completed':
+                            # Déclencher les actions selon le statut, une seule fois par transition
+                            if odoo_status == previous_status:
+                                pass
+                            elif odoo_status == 'completed':
                                 self._handle_payment_completed(transaction, session_data)
                             elif odoo_status == 'failed':
                                 self._handle_payment_failed(transaction, session_data)
@@ -367,19 +419,7 @@ class WaveMoneyController(http.Controller):
 
     def _map_wave_status_to_odoo(self, checkout_status, payment_status):
         """Mapper les statuts Wave vers les statuts Odoo"""
-        checkout_status = checkout_status.lower()
-        payment_status = payment_status.lower()
-
-        if checkout_status == 'complete' and payment_status == 'succeeded':
-            return 'completed'
-        elif checkout_status == 'failed' or payment_status == 'failed':
-            return 'failed'
-        elif checkout_status == 'cancelled' or payment_status == 'cancelled':
-            return 'cancelled'
-        elif checkout_status == 'expired':
-            return 'expired'
-        else:
-            return 'pending'
+        return map_status(checkout_status, payment_status)
 
     def _handle_payment_completed(self, transaction, payment_data):
         """Gérer un paiement complété"""
@@ -412,31 +452,51 @@ class WaveMoneyController(http.Controller):
             _logger.error(f"Error handling failed payment: {str(e)}")
 
     def _refresh_transaction_status(self, transaction):
-        """Rafraîchir le statut d'une transaction depuis l'API Wave"""
+        """Rafraîchir le statut d'une transaction depuis l'API Wave.
+
+        Les polls simultanés d'une même session sont regroupés : dans un worker,
+        les requêtes concurrentes attendent le résultat de la première ; entre
+        workers, un verrou consultatif tenu jusqu'au commit de la requête
+        meneuse évite un second appel Wave et une seconde écriture.
+        """
         try:
             _logger.info(f"Refreshing status for transaction {transaction.id}")
             config = request.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
             if not config:
                 return False
-            # Utiliser la méthode du modèle pour récupérer la session
-            session_data = config.get_session_by_id(transaction.wave_id)
 
-            if session_data:
-                wave_status = session_data.get('status', '').lower()
-                checkout_status = session_data.get('checkout_status', '').lower()
-                payment_status = session_data.get('payment_status', '').lower()
-                
-                new_status = self._map_wave_status_to_odoo(checkout_status, payment_status)
+            def fetch():
+                request.env.cr.execute(
+                    "SELECT pg_try_advisory_xact_lock(%s, hashtext(%s))",
+                    (STATUS_REFRESH_LOCK, transaction.wave_id)
+                )
+                if not request.env.cr.fetchone()[0]:
+                    return False, None
+                # Utiliser la méthode du modèle pour récupérer la session (servie par le cache
+                # tant que la transaction n'a pas été réécrite, par exemple par le webhook)
+                return True, config.get_session_by_id(transaction.wave_id, stamp=transaction.updated_at)
+
+            (locked, session_data), leader = _status_flight.do((request.env.cr.dbname, transaction.wave_id), fetch)
+            if not locked:
+                # Un autre worker rafraîchit déjà cette session : servir l'état en base
+                return True
 
-                if new_status != transaction.status:
+            if session_data:
+                new_status = self._map_wave_status_to_odoo(*raw_statuses(session_data))
+                raw_vals = transaction._raw_status_vals(session_data)
+
+                if new_status != transaction.status and can_transition(transaction.status, new_status):
+                    if not leader:
+                        # La requête meneuse écrit la transaction : ne mettre à jour que la vue locale
+                        transaction._update_cache(dict(raw_vals, status=new_status), validate=False)
+                        return True
                     _logger.info(f"Updating status of transaction {transaction.id} from {transaction.status} to {new_status}")
                     transaction.write({
                         'status': new_status,
                         'updated_at': fields.Datetime.now(),
                         'wave_response': json.dumps(session_data),
-                        'checkout_status': session_data.get('checkout_status'),
-                        'payment_status': session_data.get('payment_status'),
                         'completed_at' : session_data.get('when_completed'),
+                        **raw_vals,
                     })
                 return True
         except Exception as e:
@@ -870,11 +930,6 @@ class WaveMoneyController(http.Controller):
             transactions = request.env['wave.transaction'].sudo().search([('partner_id', '=', partner_id)])
 
             for transaction_up in transactions:
-                # Convertir les données binaires en base64
-                facture_pdf_base64 = None
-                if transaction_up.facture_pdf:
-                    facture_pdf_base64 = base64.b64encode(transaction_up.facture_pdf).decode('utf-8')
-
                 resultats.append({
                     'transaction_id': transaction_up.transaction_id,
                     'custom_transaction_id': transaction_up.transaction_id,
@@ -897,7 +952,6 @@ class WaveMoneyController(http.Controller):
                     'created_at': transaction_up.created_at.isoformat(),
                     'updated_at': transaction_up.updated_at.isoformat(),
                     'completed_at': transaction_up.completed_at.isoformat() if transaction_up.completed_at else None,
-                    # 'facture_pdf': facture_pdf_base64,
                     'url_facture': transaction_up.url_facture
                 })
 
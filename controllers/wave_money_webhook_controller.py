@@ -4,25 +4,18 @@ from odoo import http, fields
 from odoo.http import request, Response
 import logging
 import json
-from datetime import datetime
 
 _logger = logging.getLogger(__name__)
 
 class WaveMoneyWebhookController(http.Controller):
 
-    def _map_wave_status_to_odoo(self, checkout_status, payment_status):
-        status_map = {
-            ('complete', 'succeeded'): 'completed',
-            ('failed', 'any'): 'failed',
-            ('any', 'failed'): 'failed',
-            ('cancelled', 'any'): 'cancelled',
-            ('any', 'cancelled'): 'cancelled',
-            ('expired', 'any'): 'expired',
-        }
-        return status_map.get((checkout_status, payment_status), 'pending')
-
     @http.route('/wave/webhook', type='http', auth='public', csrf=False, methods=['POST'])
     def wave_webhook(self, **kwargs):
+        """Enregistrer le webhook dans la file et acquitter immédiatement.
+
+        Le traitement (mise à jour de la transaction, paiement, facture) est
+        effectué en arrière-plan par wave.webhook.event.
+        """
         try:
             config = request.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
             if not config:
@@ -34,61 +27,24 @@ class WaveMoneyWebhookController(http.Controller):
             except json.JSONDecodeError:
                 return self._json_response({'error': 'Invalid JSON'}, 400)
 
-            result = self._process_wave_webhook(webhook_data)
-            return self._json_response(result, 200)
+            event, duplicate = request.env['wave.webhook.event'].sudo()._enqueue(body.decode('utf-8'), webhook_data)
+            if duplicate:
+                # Livraison répétée : renvoyer le résultat d'origine sans rien retraiter
+                return self._json_response({
+                    'success': True,
+                    'duplicate': True,
+                    'event': event.id,
+                    'result': event._get_result(),
+                }, 200)
+            return self._json_response({'success': True, 'queued': True, 'event': event.id}, 200)
 
         except Exception as e:
             _logger.exception("Webhook error: %s", str(e))
             return self._json_response({'error': 'Internal server error'}, 500)
 
     def _process_wave_webhook(self, webhook_data):
-        event_type = webhook_data.get('type') or webhook_data.get('event')
-        _logger.info(f"Processing Wave event: {event_type}")
-
-        if event_type != "checkout.session.completed":
-            return {'success': False, 'error': 'Unhandled event'}
-
-        session = webhook_data.get('data', {})
-        session_id = session.get('id')
-        if not session_id:
-            return {'success': False, 'error': 'Missing session ID'}
-
-        transaction = request.env['wave.transaction'].sudo().search([('wave_id', '=', session_id)], limit=1)
-        if not transaction:
-            return {'success': False, 'error': 'Transaction not found'}
-
-        checkout_status = session.get('checkout_status', '').lower()
-        payment_status = session.get('payment_status', '').lower()
-        new_status = self._map_wave_status_to_odoo(checkout_status, payment_status)
-
-        transaction.write({
-            'status': new_status,
-            'updated_at': fields.Datetime.now(),
-            'completed_at': self.convert_iso_format_to_custom_format(session.get('when_completed')),
-            'webhook_data': json.dumps(webhook_data),
-            'checkout_status': checkout_status,
-            'payment_status': payment_status,
-        })
-
-        if new_status == 'completed':
-
-            result = self._create_payment_transaction(transaction)
-            _logger.info(f"Payment transaction created: {result}")
-
-            # pourcentage = (100 * transaction.amount) / transaction.order_id.amount_total if transaction.order_id.amount_total else 0
-            # invoice = self.create_advance_invoice(transaction.order_id, pourcentage)
-            # if invoice:
-            #     return self.process_payment(transaction.order_id, invoice, transaction.amount, request.env.company)
-            # else:
-            #     return {'success': False, 'error': 'Invoice creation failed'}
-
-        return {'success': True}
-
-    def convert_iso_format_to_custom_format(self, iso_date):
-        try:
-            return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            return None
+        """Traiter un webhook immédiatement (hors file)"""
+        return request.env['wave.webhook.event'].sudo()._process_wave_webhook(webhook_data)
 
     def _json_response(self, data, status):
         return Response(json.dumps(data), status=status, mimetype='application/json')
@@ -279,71 +235,3 @@ class WaveMoneyWebhookController(http.Controller):
         except Exception as e:
             _logger.exception("Erreur lors de la réconciliation du paiement: %s", str(e))
             return None
-
-
-
-
-
-    def _create_payment_transaction(self, transaction):
-        try:
-            order = transaction.order_id
-            company = order.company_id
-            partner = order.partner_id
-            amount = transaction.amount
-
-            user = request.env['res.users'].sudo().browse(request.env.uid)
-            if not user or user._is_public():
-                admin_user = request.env.ref('base.user_admin')
-                request.env = request.env(user=admin_user.id)
-
-
-            journal = request.env['account.journal'].sudo().search([('code', '=', 'CSH1'), ('company_id', '=', company.id)], limit=1)
-            _logger.info("journal: %s", journal)
-            payment_method = request.env['account.payment.method'].sudo().search([('payment_type', '=', 'inbound')], limit=1)
-            _logger.info("payment_method: %s", payment_method)
-            
-            if not journal:
-                journal = request.env['account.journal'].sudo().search([('type', 'in', ['cash', 'bank']), ('company_id', '=', company.id)], limit=1)
-
-            if not payment_method:
-                payment_method = request.env['account.payment.method'].sudo().search([('payment_type', '=', 'inbound')], limit=1)
-
-            
-            if not company:
-                company = request.env['res.company'].sudo().search([('id', '=', 1)], limit=1)
-
-            if order and order.type_sale == 'order':
-                order.action_confirm()
-
-            try:
-                if order.advance_payment_status != 'paid':
-                    payment_vals  = {
-                        'payment_type': 'inbound',
-                        'partner_type': 'customer',
-                        'partner_id': partner.id,
-                        'amount': amount,
-                        'journal_id': journal.id,
-                        'currency_id': journal.currency_id.id,
-                        'payment_method_line_id': 1,
-                        'payment_method_id': payment_method.id,
-                        'ref': order.name,
-                        'sale_id': order.id,
-                        'is_reconciled': True,
-                    }
-                    account_payment = request.env['account.payment'].sudo().create(payment_vals)
-                    if account_payment:
-                        account_payment.action_post()
-                        if order and order.type_sale == 'creditorder':
-                            order.action_confirm()
-
-                        _logger.info(f"Payment created for transaction {transaction.transaction_id}")
-                        return True
-                    else:
-                        return False
-            except Exception as e:
-                _logger.error(f"Error creating payment: {str(e)}")
-                return False
-            
-        except Exception as e:
-            _logger.error(f"Error handling completed payment: {str(e)}")
-            return False
\ No newline at end of file
@@ -0,0 +1,56 @@
+
+import base64
+import logging
+import zlib
+
+from psycopg2.extras import execute_values
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def _compress(content):
+    return base64.b64encode(zlib.compress(content.encode('utf-8')))
+
+
+def migrate(cr, version):
+    """Déplacer wave_response et webhook_data vers wave_transaction_payload"""
+    cr.execute("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_name = 'wave_transaction' AND column_name IN ('wave_response', 'webhook_data')
+    """)
+    columns = {row[0] for row in cr.fetchall()}
+    if not columns:
+        return
+
+    kinds = [(column, kind) for column, kind in (('wave_response', 'response'), ('webhook_data', 'webhook'))
+             if column in columns]
+    moved = 0
+    for column, kind in kinds:
+        last_id = 0
+        while True:
+            cr.execute(f"""
+                SELECT id, {column}, COALESCE(updated_at, created_at) FROM wave_transaction
+                 WHERE id > %s AND {column} IS NOT NULL AND {column} != ''
+                 ORDER BY id
+                 LIMIT %s
+            """, (last_id, BATCH_SIZE))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            execute_values(cr, """
+                INSERT INTO wave_transaction_payload
+                       (transaction_ref_id, kind, data, size, created_at, create_date, write_date)
+                VALUES %s
+            """, [
+                (transaction_id, kind, _compress(content), len(content.encode('utf-8')), date, date, date)
+                for transaction_id, content, date in rows
+            ])
+            moved += len(rows)
+            last_id = rows[-1][0]
+
+    # Les colonnes ne sont plus utilisées : les supprimer pour alléger la table
+    for column in columns:
+        cr.execute(f"ALTER TABLE wave_transaction DROP COLUMN {column}")
+    _logger.info(f"{moved} contenu(s) Wave déplacé(s) vers wave_transaction_payload")
@@ -0,0 +1,48 @@
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Relier chaque transaction à une seule pièce jointe PDF.
+
+    Jusqu'ici le PDF était stocké deux fois : pièce jointe publique et
+    pièce jointe du champ binaire facture_pdf. On garde la première (ou,
+    à défaut, celle du champ, convertie en pièce jointe ordinaire).
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Attachment = env['ir.attachment'].with_context(active_test=False)
+    field_attachments = Attachment.search([
+        ('res_model', '=', 'wave.transaction'),
+        ('res_field', '=', 'facture_pdf'),
+    ])
+    linked = 0
+    for field_attachment in field_attachments:
+        transaction = env['wave.transaction'].browse(field_attachment.res_id).exists()
+        if not transaction:
+            field_attachment.unlink()
+            continue
+        attachment = Attachment.search([
+            ('res_model', '=', 'wave.transaction'),
+            ('res_id', '=', transaction.id),
+            ('res_field', '=', False),
+            ('mimetype', '=', 'application/pdf'),
+        ], order='id desc', limit=1)
+        if attachment:
+            field_attachment.unlink()
+        else:
+            field_attachment.write({
+                'res_field': False,
+                'name': transaction.facture_filename or field_attachment.name,
+                'public': True,
+            })
+            attachment = field_attachment
+        cr.execute(
+            "UPDATE wave_transaction SET facture_attachment_id = %s WHERE id = %s",
+            (attachment.id, transaction.id),
+        )
+        linked += 1
+    _logger.info(f"{linked} facture(s) Wave reliée(s) à une pièce jointe unique")
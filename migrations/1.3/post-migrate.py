@@ -0,0 +1,23 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Passer à la génération des factures à la demande.
+
+    url_facture pointe désormais vers la route de téléchargement. Les anciennes URL /web/content restent valables ; les nouvelles
+    rendent la facture à la demande si elle n'a pas encore été générée.
+    """
+    # Les factures ne sont plus générées à la complétion : les tâches PDF encore
+    # en file sont abandonnées, le reçu sera rendu au premier téléchargement
+    cr.execute("DELETE FROM wave_transaction_job WHERE job_type = 'invoice_pdf'")
+    _logger.info(f"{cr.rowcount} tâche(s) de facture PDF Wave supprimée(s)")
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    transactions = env['wave.transaction'].search([('completed_at', '!=', False)])
+    env.add_to_compute(transactions._fields['url_facture'], transactions)
+    transactions.flush_recordset(['url_facture'])
+    _logger.info(f"URL de facture mise à jour pour {len(transactions)} transaction(s) Wave")
@@ -0,0 +1,14 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Stocker les contenus compressés bruts, sans la couche base64 (un tiers plus compact)"""
+    for table in ('wave_transaction_payload', 'wave_transaction_archive'):
+        cr.execute(f"""
+            UPDATE {table}
+               SET data = decode(convert_from(data, 'UTF8'), 'base64')
+             WHERE data IS NOT NULL
+        """)
+        _logger.info(f"{cr.rowcount} contenu(s) de {table} décodé(s) du base64")
@@ -3,6 +3,12 @@
 
 from . import wave_config
 from . import wave_transaction
+from . import wave_transaction_job
+from . import wave_transaction_payload
+from . import wave_transaction_archive
+from . import wave_rate_bucket
+from . import wave_webhook_event
+from . import wave_webhook_dead_letter
 
 # from . import payment_order
 from . import sale_order 
\ No newline at end of file
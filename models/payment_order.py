@@ -9,7 +9,8 @@ from datetime import datetime
 
 
 from odoo.http import request, Response
-import requests
+
+from ..tools.rate_limiter import PRIORITY_INITIATE
 
 _logger = logging.getLogger(__name__)
 
@@ -129,18 +130,8 @@ class PaymentOrder(models.Model):
                 "error_url": config.callback_url
             }
 
-            headers = {
-                "Authorization": f"Bearer {config.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            # Appel à l'API Wave checkout sessions
-            response = requests.post(
-                "https://api.wave.com/v1/checkout/sessions",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            # Appel à l'API Wave checkout sessions (client partagé du worker)
+            response = config._get_wave_client().post("checkout/sessions", json=payload, priority=PRIORITY_INITIATE)
 
             if response.status_code in [200, 201]:
                 data = response.json()
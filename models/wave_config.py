@@ -1,6 +1,17 @@
 
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from ..tools.rate_limiter import PRIORITY_BULK, PRIORITY_INITIATE
+from ..tools.session_cache import get_session_cache
+from ..tools.wave_client import WAVE_API_URL, get_client
+
+_logger = logging.getLogger(__name__)
+
+# URL par défaut du simulateur lancé par tools/wave_simulator.py
+SIMULATOR_API_URL = 'http://127.0.0.1:8765/v1'
 
 class WaveConfig(models.Model):
     _name = 'wave.config'
@@ -53,8 +64,16 @@ class WaveConfig(models.Model):
     
     environment = fields.Selection([
         ('sandbox', 'Sandbox (Test)'),
-        ('production', 'Production')
+        ('production', 'Production'),
+        ('simulator', 'Simulateur local')
     ], string='Environnement', default='sandbox', required=True)
+
+    api_base_url = fields.Char(
+        string="URL de l'API Wave",
+        required=True,
+        default=WAVE_API_URL,
+        help="URL de base de l'API Wave (par exemple celle du simulateur local tools/wave_simulator.py)"
+    )
     
     default_currency = fields.Selection([
         ('XOF', 'Franc CFA (XOF)'),
@@ -62,6 +81,197 @@ class WaveConfig(models.Model):
         ('EUR', 'Euro (EUR)')
     ], string='Devise par défaut', default='XOF', required=True)
     
+    # Paramètres du client HTTP
+    connect_timeout = fields.Float(
+        string='Délai de connexion (s)',
+        default=5.0,
+        required=True,
+        help="Délai maximal d'établissement de la connexion TCP/TLS vers l'API Wave"
+    )
+
+    read_timeout = fields.Float(
+        string='Délai de lecture (s)',
+        default=30.0,
+        required=True,
+        help="Délai maximal d'attente de la réponse de l'API Wave"
+    )
+
+    max_retries = fields.Integer(
+        string='Nombre de tentatives',
+        default=2,
+        help="Nombre de nouvelles tentatives en cas d'erreur réseau (les POST ne sont rejoués que si la connexion a échoué)"
+    )
+
+    pool_size = fields.Integer(
+        string='Taille du pool de connexions',
+        default=10,
+        help="Nombre maximal de connexions persistantes vers l'API Wave par worker"
+    )
+
+    bulk_max_workers = fields.Integer(
+        string='Appels parallèles (resynchronisation)',
+        default=8,
+        help="Nombre maximal de sessions Wave récupérées simultanément lors d'une resynchronisation groupée"
+    )
+
+    session_expiry_minutes = fields.Integer(
+        string='Expiration des transactions en attente (min)',
+        default=60,
+        help="Délai après lequel une transaction toujours en attente est marquée expirée. "
+             "Les sessions Wave expirent d'elles-mêmes au bout de 30 minutes. 0 pour désactiver."
+    )
+
+    archive_after_days = fields.Integer(
+        string='Archivage des transactions (jours)',
+        default=365,
+        help="Âge à partir duquel une transaction payée ou remboursée est déplacée vers l'archive compressée. "
+             "0 pour désactiver l'archivage."
+    )
+
+    job_max_workers = fields.Integer(
+        string='Tâches de facturation simultanées',
+        default=2,
+        help="Nombre maximal de tâches (facture PDF, paiement) exécutées en parallèle par l'exécuteur"
+    )
+
+    job_max_attempts = fields.Integer(
+        string='Tentatives maximales par tâche',
+        default=3
+    )
+
+    receipt_renderer = fields.Selection([
+        ('wkhtmltopdf', 'HTML (wkhtmltopdf)'),
+        ('python', 'PDF natif')
+    ], string='Moteur de rendu des reçus', default='wkhtmltopdf', required=True,
+        help="Le moteur natif écrit directement le PDF du reçu, sans wkhtmltopdf ni modèle HTML")
+
+    pdf_batch_size = fields.Integer(
+        string='Factures PDF par lot',
+        default=20,
+        help="Nombre maximal de reçus rendus en un seul appel à wkhtmltopdf lors d'une régénération groupée"
+    )
+
+    session_cache_ttl = fields.Integer(
+        string='Durée du cache des sessions (s)',
+        default=15,
+        help="Durée pendant laquelle l'état d'une session Wave non terminée est servi depuis le cache. "
+             "Les sessions terminées (complétées ou expirées) restent en cache sans expiration. 0 pour désactiver."
+    )
+
+    session_cache_size = fields.Integer(
+        string='Taille du cache des sessions',
+        default=2048,
+        help="Nombre maximal de sessions Wave conservées en cache par worker"
+    )
+
+    webhook_retention_days = fields.Integer(
+        string='Conservation des webhooks (jours)',
+        default=30,
+        help="Durée de conservation des webhooks traités. Une nouvelle livraison d'un événement "
+             "encore conservé est ignorée et renvoie le résultat d'origine. 0 pour conserver indéfiniment."
+    )
+
+    webhook_max_attempts = fields.Integer(
+        string='Tentatives maximales par webhook',
+        default=8,
+        help="Nombre de traitements en erreur après lequel un webhook est placé dans les webhooks en échec"
+    )
+
+    webhook_retry_delay = fields.Integer(
+        string='Délai initial avant rejeu (s)',
+        default=30,
+        help="Délai avant le premier rejeu d'un webhook en erreur ; il double à chaque nouvel échec"
+    )
+
+    webhook_retry_max_delay = fields.Integer(
+        string='Délai maximal avant rejeu (s)',
+        default=3600
+    )
+
+    # Limitation du débit
+    rate_limit_backend = fields.Selection([
+        ('disabled', 'Désactivée'),
+        ('postgres', 'PostgreSQL (partagée entre workers et serveurs)')
+    ], string='Limitation du débit', default='postgres', required=True,
+        help="Seau de jetons partagé limitant les appels à l'API Wave de tous les workers Odoo")
+
+    rate_limit_per_second = fields.Float(
+        string='Appels par seconde',
+        default=20.0,
+        help="Débit moyen autorisé vers l'API Wave, tous workers confondus"
+    )
+
+    rate_limit_burst = fields.Integer(
+        string='Rafale maximale',
+        default=40,
+        help="Nombre d'appels pouvant partir immédiatement après une période calme"
+    )
+
+    rate_limit_max_wait = fields.Float(
+        string='Attente maximale (s)',
+        default=2.0,
+        help="Durée pendant laquelle un appel attend un jeton avant d'échouer "
+             "(les resynchronisations groupées attendent cinq fois plus longtemps)"
+    )
+
+    # Disjoncteur
+    circuit_error_threshold = fields.Float(
+        string="Seuil d'erreurs (%)",
+        default=50.0,
+        help="Taux d'échec (erreurs réseau, 5xx, appels lents) sur la dernière minute au-delà duquel le disjoncteur s'ouvre"
+    )
+
+    circuit_min_calls = fields.Integer(
+        string="Appels minimum",
+        default=10,
+        help="Nombre minimal d'appels observés avant d'évaluer le taux d'échec et le p99"
+    )
+
+    circuit_open_duration = fields.Integer(
+        string="Durée d'ouverture (s)",
+        default=30,
+        help="Durée pendant laquelle les appels échouent immédiatement avant un appel de sonde"
+    )
+
+    circuit_slow_call = fields.Float(
+        string='Appel lent (s)',
+        default=5.0,
+        help="Un appel plus long que ce délai compte comme un échec"
+    )
+
+    adaptive_timeout = fields.Boolean(
+        string='Délai de lecture adaptatif',
+        default=True,
+        help="Ajuster le délai de lecture au p99 observé des appels réussis (borné par le délai de lecture configuré)"
+    )
+
+    circuit_state = fields.Selection([
+        ('closed', 'Fermé'),
+        ('open', 'Ouvert'),
+        ('half_open', 'Demi-ouvert')
+    ], string='État du disjoncteur', compute='_compute_circuit_state',
+        help="État du disjoncteur dans le worker courant")
+
+    circuit_error_rate = fields.Float(
+        string="Taux d'échec (%)",
+        compute='_compute_circuit_state'
+    )
+
+    circuit_calls = fields.Integer(
+        string='Appels observés',
+        compute='_compute_circuit_state'
+    )
+
+    circuit_p99_latency = fields.Float(
+        string='Latence p99 (ms)',
+        compute='_compute_circuit_state'
+    )
+
+    circuit_read_timeout = fields.Float(
+        string='Délai de lecture appliqué (s)',
+        compute='_compute_circuit_state'
+    )
+
     # Champs de suivi
     created_at = fields.Datetime(
         string='Date de création', 
@@ -103,6 +313,26 @@ class WaveConfig(models.Model):
             record.successful_transactions = len(transactions.filtered(lambda t: t.status == 'completed'))
             record.failed_transactions = len(transactions.filtered(lambda t: t.status == 'failed'))
 
+    def _compute_circuit_state(self):
+        """Lire l'état du disjoncteur du client Wave du worker courant"""
+        for record in self:
+            snapshot = {'state': 'closed', 'calls': 0, 'error_rate': 0.0, 'p99': 0.0, 'read_timeout': record.read_timeout}
+            if record.id and record.api_key:
+                snapshot = record._get_wave_client().breaker.snapshot(record.read_timeout)
+            record.circuit_state = snapshot['state']
+            record.circuit_calls = snapshot['calls']
+            record.circuit_error_rate = snapshot['error_rate'] * 100
+            record.circuit_p99_latency = snapshot['p99'] * 1000
+            record.circuit_read_timeout = snapshot['read_timeout']
+
+    @api.onchange('environment')
+    def _onchange_environment(self):
+        """Proposer l'URL de l'API correspondant à l'environnement"""
+        if self.environment == 'simulator':
+            self.api_base_url = SIMULATOR_API_URL
+        elif self.api_base_url == SIMULATOR_API_URL:
+            self.api_base_url = WAVE_API_URL
+
     @api.constrains('is_active')
     def _check_single_active_config(self):
         """S'assurer qu'une seule configuration est active"""
@@ -192,16 +422,42 @@ class WaveConfig(models.Model):
                 }
             }
         
+    def _get_wave_client(self):
+        """Retourner le client Wave (pool de connexions persistantes) du worker courant"""
+        self.ensure_one()
+        return get_client(
+            (self.env.cr.dbname, self.id),
+            api_key=self.api_key,
+            base_url=self.api_base_url or WAVE_API_URL,
+            connect_timeout=self.connect_timeout or 5.0,
+            read_timeout=self.read_timeout or 30.0,
+            max_retries=max(self.max_retries, 0),
+            pool_size=max(self.pool_size, 1),
+            breaker={
+                'error_threshold': self.circuit_error_threshold / 100.0,
+                'min_calls': max(self.circuit_min_calls, 1),
+                'open_duration': self.circuit_open_duration,
+                'slow_call': self.circuit_slow_call or self.read_timeout or 30.0,
+                'adaptive_timeout': self.adaptive_timeout,
+            },
+            rate_limit=self.rate_limit_backend == 'postgres' and {
+                'dbname': self.env.cr.dbname,
+                'config_id': self.id,
+                'rate': max(self.rate_limit_per_second, 0.1),
+                'burst': max(self.rate_limit_burst, 1),
+                'max_wait': self.rate_limit_max_wait,
+            },
+        )
+
+    def action_reset_circuit(self):
+        """Refermer le disjoncteur du worker courant"""
+        for record in self:
+            record._get_wave_client().breaker.reset()
+        return True
+
     def test_connection(self):
         """Tester la connexion à l'API Wave"""
         try:
-            import requests
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-
             # Test avec un endpoint compatible avec checkout_api
             # Créer un paiement de test minimal pour vérifier la connexion
             test_payload = {
@@ -212,12 +468,7 @@ class WaveConfig(models.Model):
             }
 
             # Utiliser l'endpoint de création de checkout sessions qui fonctionne avec checkout_api
-            response = requests.post(
-                "https://api.wave.com/v1/checkout/sessions",
-                json=test_payload,
-                headers=headers,
-                timeout=10
-            )
+            response = self._get_wave_client().post("checkout/sessions", json=test_payload, priority=PRIORITY_INITIATE)
 
             if response.status_code == 201 :
                 # Succès - supprimer le paiement de test si possible
@@ -287,42 +538,80 @@ class WaveConfig(models.Model):
                 }
             }
         
-    def get_session_by_id(self, session_id):
-        """Récupérer une session de paiement par son ID"""
+    def _get_session_cache(self):
+        """Retourner le cache des sessions Wave du worker courant, ou None s'il est désactivé"""
+        self.ensure_one()
+        if self.session_cache_ttl <= 0:
+            return None
+        return get_session_cache(
+            (self.env.cr.dbname, self.id),
+            maxsize=max(self.session_cache_size, 1),
+            ttl=self.session_cache_ttl,
+        )
+
+    def invalidate_session_cache(self, session_id):
+        """Retirer une session du cache du worker courant"""
+        cache = self._get_session_cache()
+        if cache is not None:
+            cache.invalidate(session_id)
+
+    def get_session_by_id(self, session_id, stamp=None, use_cache=True):
+        """Récupérer une session de paiement par son ID.
+
+        La lecture passe par le cache des sessions : ``stamp`` (date de mise à
+        jour de la transaction) invalide l'entrée si la transaction a été
+        réécrite depuis, ``use_cache=False`` force l'appel à l'API Wave.
+        """
         try:
-            import requests
+            cache = self._get_session_cache() if use_cache else None
+            if cache is not None:
+                session_data = cache.get(session_id, stamp=stamp)
+                if session_data is not None:
+                    return session_data
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",  
-                "Content-Type": "application/json",
-            }
-            response = requests.get(
-                f"https://api.wave.com/v1/checkout/sessions/{session_id}",
-                headers=headers,
-                timeout=10
-            )
+            response = self._get_wave_client().get(f"checkout/sessions/{session_id}")
 
             if response.status_code == 200:
-                return response.json()
+                session_data = response.json()
+                if cache is not None:
+                    cache.set(session_id, session_data, stamp=stamp)
+                return session_data
             else:
                 return None
 
         except Exception as e:
             return None
+
+    def get_sessions_bulk(self, session_ids):
+        """Récupérer plusieurs sessions de paiement en parallèle.
+
+        Les appels HTTP sont répartis sur un pool borné de threads (aucun accès
+        ORM dans les threads) et partagent le pool de connexions du worker.
+        Retourne un dictionnaire {session_id: données de session ou None}.
+        """
+        self.ensure_one()
+        session_ids = list(dict.fromkeys(session_id for session_id in session_ids if session_id))
+        if not session_ids:
+            return {}
+
+        client = self._get_wave_client()
+
+        def fetch(session_id):
+            try:
+                response = client.get(f"checkout/sessions/{session_id}", priority=PRIORITY_BULK)
+                return response.json() if response.status_code == 200 else None
+            except Exception as e:
+                _logger.warning(f"Erreur lors de la récupération de la session Wave {session_id}: {str(e)}")
+                return None
+
+        max_workers = min(max(self.bulk_max_workers, 1), len(session_ids))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wave_bulk') as executor:
+            return dict(zip(session_ids, executor.map(fetch, session_ids)))
+
     def get_seesion_by_id_transaction(self, transaction_id):
         """Récupérer une session de paiement par son ID de transaction"""
         try:
-            import requests
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-            response = requests.get(
-                f"https://api.wave.com/v1/checkout/sessions?transaction_id={transaction_id}",
-                headers=headers,
-                timeout=10
-            )
+            response = self._get_wave_client().get("checkout/sessions", params={'transaction_id': transaction_id})
 
             if response.status_code == 200:
                 return response.json()
@@ -335,18 +624,7 @@ class WaveConfig(models.Model):
     def refund_transaction(self, session_id):
         """Rembourser une transaction Wave"""
         try:
-            import requests
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-        
-            response = requests.post(
-                f"https://api.wave.com/v1/checkout/sessions/{session_id}/refund",
-                headers=headers,
-                timeout=10
-            )
+            response = self._get_wave_client().post(f"checkout/sessions/{session_id}/refund", priority=PRIORITY_INITIATE)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -0,0 +1,29 @@
+
+from odoo import models, fields
+
+
+class WaveRateBucket(models.Model):
+    _name = 'wave.rate.bucket'
+    _description = 'Seau de jetons des appels API Wave'
+    _rec_name = 'config_id'
+
+    # Ligne mise à jour en SQL direct par PostgresRateLimiter, une par configuration
+    config_id = fields.Many2one(
+        'wave.config',
+        string='Configuration',
+        required=True,
+        ondelete='cascade'
+    )
+
+    tokens = fields.Float(
+        string='Jetons disponibles',
+        help="Jetons restants lors de la dernière mise à jour"
+    )
+
+    updated_at = fields.Datetime(
+        string='Dernière mise à jour'
+    )
+
+    _sql_constraints = [
+        ('config_id_unique', 'UNIQUE(config_id)', 'Un seul seau de jetons par configuration Wave.'),
+    ]
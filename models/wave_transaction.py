@@ -3,12 +3,42 @@ from odoo import models, fields, api
 import json
 from odoo.exceptions import ValidationError
 import logging
-import base64
 import io
+import base64
+import hashlib
 from datetime import datetime
+from markupsafe import Markup
+from psycopg2.errors import UniqueViolation
+
+from odoo.tools import file_open
+from odoo.tools.mimetypes import guess_mimetype
+from odoo.tools.misc import hmac as hmac_tool
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
+from odoo.tools.sql import create_index
+
+from ..tools.receipt_pdf import render_receipt
+from ..tools.wave_indexes import TRANSACTION_INDEXES
+from ..tools.wave_status import classify_sessions, raw_statuses, session_status
 
 _logger = logging.getLogger(__name__)
 
+RECEIPT_PAPERFORMAT_ARGS = {
+    'data-report-margin-top': 10,
+    'data-report-margin-bottom': 10,
+    'data-report-margin-left': 10,
+    'data-report-margin-right': 10,
+    'data-report-page-size': 'A4',
+}
+
+# À incrémenter quand la mise en page du reçu change : invalide toutes les empreintes facture_hash
+RECEIPT_LAYOUT_VERSION = 1
+
+# Portée du jeton d'accès aux factures, calculé sur l'ID de la transaction (conservé par l'archive)
+INVOICE_TOKEN_SCOPE = 'wave-invoice'
+
+# Ressources du reçu (CSS, logo) par (base, société), partagées par les requêtes du worker
+_RECEIPT_ASSETS = {}
+
 class WaveTransaction(models.Model):
     _name = 'wave.transaction'
     _description = 'Transaction Wave Money'
@@ -77,7 +107,9 @@ class WaveTransaction(models.Model):
     payment_status = fields.Selection([
         ('processing', 'En cours'),
         ('cancelled', 'Annulé'),
-        ('succeeded', 'Réussi')
+        ('succeeded', 'Réussi'),
+        ('failed', 'Échoué'),
+        ('refunded', 'Remboursé')
     ], string='Statut de paiement', help="Statut de paiement de Wave")
     # URLs et données
     payment_link_url = fields.Char(
@@ -86,13 +118,28 @@ class WaveTransaction(models.Model):
     )
 
     # NOUVEAU CHAMP POUR LA FACTURE
+    # Route de téléchargement : le PDF n'est rendu qu'à la première consultation
     url_facture = fields.Char(
         string="URL de la facture",
-        help="URL vers le fichier PDF de la facture générée"
+        compute='_compute_url_facture',
+        store=True,
+        help="URL de téléchargement de la facture PDF, générée à la première consultation"
     )
 
+    facture_attachment_id = fields.Many2one(
+        'ir.attachment',
+        string="Pièce jointe de la facture",
+        ondelete='set null',
+        readonly=True,
+        copy=False,
+        help="Pièce jointe unique contenant le PDF de la facture"
+    )
+
+    # Lu depuis la pièce jointe à la demande : jamais chargé par les listes
     facture_pdf = fields.Binary(
         string="Facture PDF",
+        related='facture_attachment_id.datas',
+        readonly=True,
         help="Fichier PDF de la facture"
     )
 
@@ -101,6 +148,13 @@ class WaveTransaction(models.Model):
         help="Nom du fichier PDF de la facture"
     )
 
+    facture_hash = fields.Char(
+        string="Empreinte de la facture",
+        readonly=True,
+        copy=False,
+        help="Empreinte des données affichées sur le reçu ; la facture n'est pas régénérée tant qu'elle ne change pas"
+    )
+
     facture_generated_at = fields.Datetime(
         string="Date de génération de la facture",
         help="Date à laquelle la facture a été générée"
@@ -111,22 +165,36 @@ class WaveTransaction(models.Model):
         help="Taille du fichier PDF de la facture en octets"
     )
 
+    # Contenus bruts conservés dans wave.transaction.payload (historique complet, compressé)
     wave_response = fields.Text(
         string="Réponse Wave",
-        help="Réponse complète de l'API Wave lors de la création"
+        compute='_compute_payloads',
+        inverse='_inverse_wave_response',
+        help="Dernière réponse complète de l'API Wave"
     )
 
     webhook_data = fields.Text(
         string="Données Webhook",
+        compute='_compute_payloads',
+        inverse='_inverse_webhook_data',
         help="Dernières données reçues via webhook"
     )
+
+    payload_ids = fields.One2many(
+        'wave.transaction.payload',
+        'transaction_ref_id',
+        string="Historique des échanges",
+        readonly=True
+    )
     # Relations
     order_id = fields.Many2one(
         'sale.order',
         string="Commande liée",
+        index=True,
         help="Commande de vente associée à cette transaction"
     )
 
+    # Indexé par wave_transaction_partner_created_at_idx (voir init)
     partner_id = fields.Many2one(
         'res.partner',
         string="Client",
@@ -163,6 +231,22 @@ class WaveTransaction(models.Model):
         compute='_compute_formatted_amount',
         store=False
     )
+    job_ids = fields.One2many(
+        'wave.transaction.job',
+        'transaction_ref_id',
+        string="Tâches",
+        readonly=True
+    )
+
+    job_state = fields.Selection([
+        ('none', 'Aucune'),
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminées'),
+        ('failed', 'En échec')
+    ], string="Tâches de facturation", compute='_compute_job_state',
+        help="État des tâches différées (facture PDF, paiement) de la transaction")
+
     auto_saved = fields.Boolean(
         string="Enregistré automatiquement",
         default=True,
@@ -170,6 +254,11 @@ class WaveTransaction(models.Model):
     )
 
 
+    def init(self):
+        """Créer les index composites et partiels correspondant aux requêtes du module"""
+        for name, expressions, where in TRANSACTION_INDEXES:
+            create_index(self.env.cr, name, self._table, expressions, where=where)
+
     @api.depends('status')
     def _compute_status_color(self):
         """Calculer la couleur selon le statut"""
@@ -184,54 +273,165 @@ class WaveTransaction(models.Model):
         for record in self:
             record.status_color = color_map.get(record.status, 0)
 
+    @api.depends('payload_ids')
+    def _compute_payloads(self):
+        """Lire le dernier contenu de chaque type depuis le journal des échanges"""
+        Payload = self.env['wave.transaction.payload'].sudo()
+        ids = [record.id for record in self if isinstance(record.id, int)]
+        responses = Payload._get_latest(ids, 'response')
+        webhooks = Payload._get_latest(ids, 'webhook')
+        for record in self:
+            record.wave_response = responses.get(record.id, False)
+            record.webhook_data = webhooks.get(record.id, False)
+
+    def _inverse_wave_response(self):
+        self.env['wave.transaction.payload'].sudo()._append(
+            [(record.id, 'response', record.wave_response) for record in self]
+        )
+
+    def _inverse_webhook_data(self):
+        self.env['wave.transaction.payload'].sudo()._append(
+            [(record.id, 'webhook', record.webhook_data) for record in self]
+        )
+
+    @api.depends('job_ids.state')
+    def _compute_job_state(self):
+        """Calculer l'état global des tâches différées"""
+        for record in self:
+            states = set(record.job_ids.mapped('state'))
+            for state in ('failed', 'running', 'pending', 'done'):
+                if state in states:
+                    record.job_state = state
+                    break
+            else:
+                record.job_state = 'none'
+
     @api.depends('amount', 'currency')
     def _compute_formatted_amount(self):
         """Formater le montant avec la devise"""
         for record in self:
-            if record.currency == 'XOF':
-                record.formatted_amount = f"{record.amount:,.0f} FCFA"
+            record.formatted_amount = self._format_amount(record.amount, record.currency)
+
+    @api.model
+    def _format_amount(self, amount, currency):
+        if currency == 'XOF':
+            return f"{amount:,.0f} FCFA"
+        return f"{amount:,.2f} {currency}"
+
+
+    @api.depends('completed_at')
+    def _compute_url_facture(self):
+        """URL signée de la route de téléchargement, pour les transactions payées"""
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        for record in self:
+            if record.completed_at and isinstance(record.id, int):
+                record.url_facture = (f"{base_url}/api/payment/wave/invoice/{record.id}"
+                                      f"?access_token={record._get_invoice_access_token()}")
             else:
-                record.formatted_amount = f"{record.amount:,.2f} {record.currency}"
+                record.url_facture = False
+
+    def _get_invoice_access_token(self):
+        """Jeton d'accès à la facture, dérivé du secret de la base (rien n'est stocké)"""
+        self.ensure_one()
+        return hmac_tool(self.env(su=True), INVOICE_TOKEN_SCOPE, self.id)
 
+    def _get_invoice_attachment(self):
+        """Retourner la pièce jointe PDF de la facture, rendue au premier accès.
+
+        La transaction est verrouillée pendant le rendu : deux téléchargements
+        simultanés ne produisent qu'une pièce jointe. Une facture dont le
+        contenu n'a pas changé est servie sans nouveau rendu.
+        """
+        self.ensure_one()
+        if not self.completed_at:
+            return self.env['ir.attachment']
+        self.env.cr.execute("SELECT id FROM wave_transaction WHERE id = %s FOR UPDATE", (self.id,))
+        self._generate_invoice_pdf()
+        return self.facture_attachment_id
 
     def _generate_invoice_pdf(self):
         """Générer la facture PDF pour la transaction"""
-        try:
-            _logger.info(f"Génération de la facture PDF pour la transaction {self.transaction_id}")
+        self.ensure_one()
+        return self._generate_invoice_pdfs().get(self.id, False)
 
-            # Créer le contenu HTML de la facture
-            html_content = self._get_invoice_html_content()
-
-            # Générer le PDF à partir du HTML
-            pdf_content = self._html_to_pdf(html_content)
+    def _generate_invoice_pdfs(self):
+        """Générer les factures PDF de plusieurs transactions : {id: URL ou False}.
 
+        Les reçus sont rendus par lots de pdf_batch_size documents, chaque
+        lot en un seul appel à wkhtmltopdf, ou directement en PDF lorsque le
+        moteur natif est sélectionné dans la configuration.
+        """
+        config = self.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
+        batch_size = max(config.pdf_batch_size, 1) if config else 20
+        native = config.receipt_renderer == 'python'
+        hashes = self._get_receipt_hashes(config.receipt_renderer or 'wkhtmltopdf')
+
+        # Reçu inchangé depuis le dernier rendu : la pièce jointe existante est conservée
+        unchanged = self.filtered(
+            lambda t: t.facture_attachment_id and hashes[t.id] and t.facture_hash == hashes[t.id])
+        results = {record.id: record.url_facture for record in unchanged}
+        if unchanged:
+            _logger.info(f"{len(unchanged)} facture(s) à jour, rendu ignoré : {unchanged.mapped('transaction_id')}")
+
+        todo = self - unchanged
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            _logger.info(f"Génération de {len(batch)} facture(s) PDF : {batch.mapped('transaction_id')}")
+            try:
+                if native:
+                    pdfs = batch._render_receipt_pdfs()
+                else:
+                    contents = batch._get_invoice_html_contents()
+                    pdfs = batch._html_to_pdfs([contents[record.id] for record in batch])
+            except Exception as e:
+                _logger.error(f"Erreur lors de la génération des factures PDF: {str(e)}")
+                pdfs = [False] * len(batch)
+            for record, pdf_content in zip(batch, pdfs):
+                results[record.id] = record._save_invoice_pdf(pdf_content, hashes[record.id])
+        return results
+
+    def _get_receipt_hashes(self, renderer):
+        """Empreinte des données rendues sur le reçu de chaque transaction : {id: empreinte ou False}.
+
+        L'empreinte couvre les champs de la transaction, le client, la
+        commande, les coordonnées et le logo de la société, ainsi que le
+        moteur de rendu. Sans date de paiement, le reçu affiche la date du
+        rendu : il n'est alors jamais considéré comme inchangé.
+        """
+        company = self.env.company
+        company_key = [
+            company.id, company.street, company.city, company.country_id.name, company.phone, company.email,
+            hashlib.sha1(company.logo).hexdigest() if company.logo else False,
+        ]
+        hashes = {}
+        for record in self:
+            if not record.completed_at:
+                hashes[record.id] = False
+                continue
+            key = [
+                RECEIPT_LAYOUT_VERSION, renderer, company_key,
+                record.id, record.reference, record.transaction_id, record.wave_id, record.phone,
+                record.description, record.formatted_amount, str(record.completed_at),
+                record.order_id.name, record.partner_id.name, record.partner_id.email,
+            ]
+            hashes[record.id] = hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+        return hashes
+
+    def _save_invoice_pdf(self, pdf_content, receipt_hash=False):
+        """Enregistrer le PDF généré et mettre à jour la transaction ; retourner l'URL de la facture"""
+        self.ensure_one()
+        try:
             if pdf_content:
                 # Générer le nom du fichier
                 filename = f"facture_wave_{self.transaction_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
 
-                # Encoder le PDF en base64
-                pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
-
-                # Créer un attachement
-                attachment = self.env['ir.attachment'].create({
-                    'name': filename,
-                    'type': 'binary',
-                    'datas': pdf_base64,
-                    'res_model': self._name,
-                    'res_id': self.id,
-                    'mimetype': 'application/pdf',
-                    'public': True,  # Rendre accessible publiquement
-                })
-
-                # Construire l'URL d'accès
-                base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-                url_facture = f"{base_url}/web/content/{attachment.id}/{filename}"
+                attachment = self._store_invoice_pdf(pdf_content, filename)
 
                 # Mettre à jour les champs de la transaction
                 self.write({
-                    'facture_pdf': pdf_base64,
-                    'facture_filename': filename,
-                    'url_facture': url_facture,
+                    'facture_attachment_id': attachment.id,
+                    'facture_hash': receipt_hash,
+                    'facture_filename': attachment.name,
                     'facture_generated_at': fields.Datetime.now(),
                     'facture_size': len(pdf_content)
                 })
@@ -239,146 +439,206 @@ class WaveTransaction(models.Model):
                 # Enregistrer automatiquement les informations
                 self._auto_save_invoice_info()
 
-                _logger.info(f"Facture PDF générée avec succès: {url_facture}")
-                return url_facture
+                _logger.info(f"Facture PDF générée avec succès: {attachment.name}")
+                return self.url_facture
             else:
-                _logger.error("Erreur lors de la génération du PDF")
+                _logger.error(f"Erreur lors de la génération du PDF de la transaction {self.transaction_id}")
                 return False
 
         except Exception as e:
             _logger.error(f"Erreur lors de la génération de la facture PDF: {str(e)}")
             return False
 
+    def _store_invoice_pdf(self, pdf_content, filename):
+        """Enregistrer le PDF une seule fois, en réutilisant une pièce jointe de même contenu"""
+        self.ensure_one()
+        Attachment = self.env['ir.attachment'].sudo()
+        checksum = Attachment._compute_checksum(pdf_content)
+        attachment = Attachment.search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('checksum', '=', checksum),
+        ], limit=1)
+        if attachment:
+            return attachment
+
+        previous = self.facture_attachment_id
+        attachment = Attachment.create({
+            'name': filename,
+            'type': 'binary',
+            'raw': pdf_content,
+            'res_model': self._name,
+            'res_id': self.id,
+            'mimetype': 'application/pdf',
+            # Privée : servie uniquement par la route de téléchargement, qui vérifie le jeton
+        })
+        # La facture régénérée remplace la précédente
+        if previous:
+            previous.unlink()
+        return attachment
+
+    def _get_receipt_assets(self):
+        """Retourner (CSS, logo en URI data:) du reçu, mis en cache par worker.
+
+        Le logo de la société est intégré au document : wkhtmltopdf n'a plus
+        à le télécharger à chaque rendu. Le cache est renouvelé quand la
+        société est modifiée.
+        """
+        company = self.env.company
+        key = (self.env.cr.dbname, company.id)
+        cached = _RECEIPT_ASSETS.get(key)
+        if cached and cached[0] == company.write_date:
+            return cached[1]
+
+        with file_open(f'{self._module}/static/src/css/wave_receipt.css') as css_file:
+            css = Markup(css_file.read())
+        logo = False
+        if company.logo:
+            mimetype = guess_mimetype(base64.b64decode(company.logo), default='image/png')
+            logo = f"data:{mimetype};base64,{company.logo.decode()}"
+        _RECEIPT_ASSETS[key] = (company.write_date, (css, logo))
+        return css, logo
+
+    def _get_invoice_html_contents(self):
+        """Générer le HTML des reçus de plusieurs transactions : {id: html}.
+
+        Le modèle QWeb est compilé une fois par worker ; seules les valeurs
+        changent d'une transaction à l'autre.
+        """
+        css, logo = self._get_receipt_assets()
+        now = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        dates = {
+            record.id: record.completed_at.strftime('%d/%m/%Y %H:%M:%S') if record.completed_at else now
+            for record in self
+        }
+        QWeb = self.env['ir.qweb']
+        values = {
+            'company': self.env.company, 'css': css, 'logo': logo, 'dates': dates,
+            'page_template': f'{self._module}.wave_receipt_page',
+        }
+        return {
+            record.id: Markup('<!DOCTYPE html>') + QWeb._render(f'{self._module}.wave_receipt_document', dict(values, docs=record))
+            for record in self
+        }
+
     def _get_invoice_html_content(self):
         """Générer le contenu HTML de la facture avec le logo CCBM"""
-        # Récupérer les informations de l'entreprise
+        self.ensure_one()
+        return self._get_invoice_html_contents()[self.id]
+
+    def _get_receipt_values(self):
+        """Contenu du reçu pour le moteur PDF natif (même contenu que wave_receipt_page)"""
+        self.ensure_one()
+        return self._build_receipt_values({
+            'id': self.id,
+            'reference': self.reference,
+            'transaction_id': self.transaction_id,
+            'wave_id': self.wave_id,
+            'phone': self.phone,
+            'description': self.description,
+            'order_name': self.order_id.name,
+            'partner_name': self.partner_id.name,
+            'partner_email': self.partner_id.email,
+            'formatted_amount': self.formatted_amount,
+            'completed_at': self.completed_at,
+        })
+
+    @api.model
+    def _build_receipt_values(self, data):
+        """Contenu du reçu à partir de valeurs simples (transaction active ou archivée)"""
         company = self.env.company
+        date = data['completed_at'] or datetime.now()
+        rows = [
+            ('Transaction ID', data['transaction_id']),
+            ('Wave ID', data['wave_id']),
+            ('Téléphone', data['phone'] or 'N/A'),
+            ('Description', data['description'] or 'Paiement via Wave Money'),
+        ]
+        if data['order_name']:
+            rows.append(('Commande liée', data['order_name']))
+        if data['partner_name']:
+            rows += [('Client', data['partner_name']), ('Email Client', data['partner_email'] or 'N/A')]
+        return {
+            'title': 'FACTURE DE PAIEMENT',
+            'reference': data['reference'],
+            'logo': base64.b64decode(company.logo) if company.logo else None,
+            'company_name': 'CCBM SHOP',
+            'company': [
+                ('Adresse', company.street or 'Dakar, Sénégal'),
+                ('Ville', f"{company.city or 'Dakar'}, {company.country_id.name or 'Sénégal'}"),
+                ('Téléphone', company.phone or '70 922 17 75 | 70 843 04 36'),
+                ('Email', company.email or 'shop@ccbm.sn'),
+                ('Site Web', 'www.ccbmshop.sn'),
+            ],
+            'invoice': [
+                ('Numéro de facture', f"WAVE-{data['id']:06d}"),
+                ('Date de paiement', date.strftime('%d/%m/%Y %H:%M:%S')),
+                ('Mode de paiement', 'Wave Money'),
+            ],
+            'status': 'PAYÉ',
+            'rows': rows,
+            'total': data['formatted_amount'],
+            'footer': [
+                'Contacts: 70 922 17 75 | 70 843 04 36',
+                'Email: contact@ccbmshop.sn | Web: www.ccbmshop.sn',
+            ],
+        }
 
-        # Formatage de la date
-        date_facture = self.completed_at.strftime('%d/%m/%Y %H:%M:%S') if self.completed_at else datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8"/>
-            <title>Facture Wave - {self.reference}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; }}
-                .header {{ text-align: center; margin-bottom: 30px; border-bottom: 2px solid #2879b9; padding-bottom: 20px; }}
-                .company-section {{ display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 30px; }}
-                .company-info {{ flex: 1; text-align: left; }}
-                .company-logo {{ flex: 0 0 200px; text-align: right; }}
-                .company-logo img {{ max-width: 180px; max-height: 120px; object-fit: contain; }}
-                .invoice-info {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin-bottom: 20px; }}
-                .transaction-details {{ margin-bottom: 20px; }}
-                .table {{ width: 100%; border-collapse: collapse; margin-bottom: 20px; }}
-                .table th, .table td {{ border: 1px solid #dee2e6; padding: 8px; text-align: left; }}
-                .table th {{ background-color: #2879b9; color: white; }}
-                .total {{ font-size: 18px; font-weight: bold; text-align: right; margin-top: 20px; }}
-                .footer {{ margin-top: 40px; text-align: center; font-size: 12px; color: #6c757d; }}
-                .status-success {{ color: #28a745; font-weight: bold; }}
-                .ccbm-branding {{ color: #2879b9; font-weight: bold; }}
-            </style>
-        </head>
-        <body>
-
-            <div class="header"
-                style="display: flex; justify-content: space-between; align-items: center; border-bottom: 2px solid #2879b9; padding-bottom: 20px; margin-bottom: 30px;">
-                <div style="text-align: left;">
-                    <h2 class="ccbm-branding" style="margin: 0;">FACTURE DE PAIEMENT</h2>
-                    <h3 style="margin: 5px 0 0;">Référence: {self.reference}</h3>
-                </div>
-                <div class="company-logo" style="text-align: right;">
-                    <img src="https://ccbmshop.sn/logo.png" alt="CCBM Shop Logo"
-                        style="max-width: 180px; max-height: 120px; object-fit: contain;" onerror="this.style.display='none'" />
-                </div>
-            </div>
-
-            
-            <div class="company-section" style="display: flex; justify-content: space-between; align-items: center; gap: 20px;">
-                <div class="company-info">
-                    <h3 class="ccbm-branding">CCBM SHOP</h3>
-                    <p><strong>Adresse:</strong> {company.street or 'Dakar, Sénégal'}</p>
-                    <p><strong>Ville:</strong> {company.city or 'Dakar'}, {company.country_id.name or 'Sénégal'}</p>
-                    <p><strong>Téléphone:</strong> {company.phone or '70 922 17 75 | 70 843 04 36'}</p>
-                    <p><strong>Email:</strong> {company.email or 'shop@ccbm.sn'}</p>
-                    <p><strong>Site Web:</strong> www.ccbmshop.sn</p>
-                </div>
-            </div>
-
-            <div class="invoice-info">
-                <h3>Informations de la facture</h3>
-                <p><strong>Numéro de facture:</strong> WAVE-{self.id:06d}</p>
-                <p><strong>Date de paiement:</strong> {date_facture}</p>
-                <p><strong>Statut:</strong> <span class="status-success">PAYÉ</span></p>
-                <p><strong>Mode de paiement:</strong> Wave Money</p>
-            </div>
-
-            <div class="transaction-details">
-                <h3>Détails de la transaction</h3>
-                <table class="table">
-                    <tr>
-                        <th>Transaction ID</th>
-                        <td>{self.transaction_id}</td>
-                    </tr>
-                    <tr>
-                        <th>Wave ID</th>
-                        <td>{self.wave_id}</td>
-                    </tr>
-                    <tr>
-                        <th>Téléphone</th>
-                        <td>{self.phone or 'N/A'}</td>
-                    </tr>
-                    <tr>
-                        <th>Description</th>
-                        <td>{self.description or 'Paiement via Wave Money'}</td>
-                    </tr>
-        """
+    def _render_receipt_pdfs(self):
+        """Écrire directement le PDF des reçus, sans passer par le HTML"""
+        pdfs = []
+        for record in self:
+            try:
+                pdfs.append(render_receipt(record._get_receipt_values()))
+            except Exception as e:
+                _logger.error(f"Erreur lors du rendu natif du reçu {record.transaction_id}: {str(e)}")
+                pdfs.append(False)
+        return pdfs
 
-        # Ajouter les détails de la commande si elle existe
-        if self.order_id:
-            html_content += f"""
-                    <tr>
-                        <th>Commande liée</th>
-                        <td>{self.order_id.name}</td>
-                    </tr>
-            """
-
-        # Ajouter les détails du client si il existe
-        if self.partner_id:
-            html_content += f"""
-                    <tr>
-                        <th>Client</th>
-                        <td>{self.partner_id.name}</td>
-                    </tr>
-                    <tr>
-                        <th>Email Client</th>
-                        <td>{self.partner_id.email or 'N/A'}</td>
-                    </tr>
-            """
-
-        html_content += f"""
-                </table>
-            </div>
-
-            <div class="total">
-                <p>MONTANT TOTAL PAYÉ: <span class="ccbm-branding">{self.formatted_amount}</span></p>
-            </div>
-
-            <div class="footer">
-                <p><strong class="ccbm-branding">CCBM SHOP</strong> </p>
-                <p style="margin-top: 15px;">
-                    <strong>Contacts:</strong> 70 922 17 75 | 70 843 04 36<br>
-                    <strong>Email:</strong> contact@ccbmshop.sn | <strong>Web:</strong> www.ccbmshop.sn
-                </p>
-            </div>
-        </body>
-        </html>
+    def _html_to_pdfs(self, html_contents):
+        """Convertir plusieurs documents HTML en PDF avec un seul appel à wkhtmltopdf.
+
+        Le PDF produit est découpé par document grâce à la table des matières
+        (un titre de premier niveau par reçu). Si le découpage échoue, chaque
+        document est rendu séparément.
         """
+        if len(html_contents) <= 1:
+            return [self._html_to_pdf(html_content) for html_content in html_contents]
+        try:
+            pdf_content = self.env['ir.actions.report']._run_wkhtmltopdf(
+                html_contents,
+                landscape=False,
+                specific_paperformat_args=RECEIPT_PAPERFORMAT_ARGS,
+            )
+            parts = self._split_pdf_by_outline(pdf_content, len(html_contents))
+            if parts:
+                return parts
+            _logger.warning(f"Découpage du PDF groupé impossible, rendu unitaire de {len(html_contents)} reçus")
+        except Exception as e:
+            _logger.error(f"Erreur lors de la conversion groupée HTML vers PDF: {str(e)}")
+        return [self._html_to_pdf(html_content) for html_content in html_contents]
 
-        return html_content
-    
+    @api.model
+    def _split_pdf_by_outline(self, pdf_content, count):
+        """Découper un PDF en ``count`` documents d'après ses signets de premier niveau"""
+        reader = PdfFileReader(io.BytesIO(pdf_content), strict=False)
+        starts = sorted({
+            reader.getDestinationPageNumber(outline)
+            for outline in reader.getOutlines()
+            if not isinstance(outline, list)
+        })
+        if len(starts) != count or starts[0] != 0:
+            return None
+        bounds = starts + [reader.getNumPages()]
+        parts = []
+        for index in range(count):
+            writer = PdfFileWriter()
+            for page in range(bounds[index], bounds[index + 1]):
+                writer.addPage(reader.getPage(page))
+            stream = io.BytesIO()
+            writer.write(stream)
+            parts.append(stream.getvalue())
+        return parts
 
     def _html_to_pdf(self, html_content):
         """Convertir le HTML en PDF"""
@@ -387,13 +647,7 @@ class WaveTransaction(models.Model):
             return self.env['ir.actions.report']._run_wkhtmltopdf(
                 [html_content],
                 landscape=False,
-                specific_paperformat_args={
-                    'data-report-margin-top': 10,
-                    'data-report-margin-bottom': 10,
-                    'data-report-margin-left': 10,
-                    'data-report-margin-right': 10,
-                    'data-report-page-size': 'A4',
-                }
+                specific_paperformat_args=RECEIPT_PAPERFORMAT_ARGS,
             )
         except Exception as e:
             _logger.error(f"Erreur lors de la conversion HTML vers PDF: {str(e)}")
@@ -427,15 +681,18 @@ class WaveTransaction(models.Model):
             # Marquer comme enregistré automatiquement
             self.write({'auto_saved': True})
 
-            # Optionnel: Envoyer une notification ou email
-            self._send_invoice_notification()
-
             return True
 
         except Exception as e:
             _logger.error(f"Erreur lors de l'enregistrement automatique: {str(e)}")
             return False
 
+    def _notify_invoice_available(self):
+        """Informer le client que sa facture est disponible (tâche de complétion)"""
+        self.ensure_one()
+        self._send_invoice_notification()
+        return True
+
     def _send_invoice_notification(self):
         """Envoyer une notification après génération de la facture"""
         try:
@@ -483,113 +740,211 @@ class WaveTransaction(models.Model):
             _logger.error(f"Erreur lors de l'envoi de la notification: {str(e)}")
 
     def write(self, vals):
-        """Surcharger write pour mettre à jour la date de modification et générer la facture"""
+        """Surcharger write pour mettre à jour la date de modification et traiter la complétion.
+
+        Fonctionne sur un ensemble quelconque d'enregistrements : les champs
+        sont mis à jour en une seule instruction, et les effets de bord de la
+        complétion ne concernent que les transactions qui passent réellement
+        au statut 'completed'.
+        """
         if 'status' in vals:
-            _logger.info(f"Changing status of transaction {self.id} from {self.status} to {vals['status']}")
+            changing = self.filtered(lambda t: t.status != vals['status'])
+            if len(changing) <= 10:
+                for transaction in changing:
+                    _logger.info(f"Changing status of transaction {transaction.id} from {transaction.status} to {vals['status']}")
+            else:
+                _logger.info(f"Changing status of {len(changing)} transactions to {vals['status']}")
 
         vals['updated_at'] = fields.Datetime.now()
 
-        # Si le statut passe à 'completed', enregistrer la date et générer la facture
-        if vals.get('status') == 'completed' and self.status != 'completed':
-            vals['completed_at'] = fields.Datetime.now()
-
-            # Appeler la méthode de génération de facture après la mise à jour
-            result = super().write(vals)
+        # Si le statut passe à 'completed', enregistrer la date (qui publie l'URL de la facture)
+        completing = self.browse()
+        if vals.get('status') == 'completed':
+            completing = self.filtered(lambda t: t.status != 'completed')
+            if completing == self:
+                vals['completed_at'] = fields.Datetime.now()
+
+        result = super().write(vals)
+        if completing:
+            if completing != self:
+                super(WaveTransaction, completing).write({'completed_at': fields.Datetime.now()})
+            # Écritures comptables et notification en arrière-plan, après le commit ;
+            # le PDF n'est rendu qu'au premier téléchargement
+            self.env['wave.transaction.job'].sudo()._enqueue(completing, ['payment', 'notification'])
+
+        return result
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Surcharger create en s'appuyant sur les contraintes d'unicité.
+
+        Le lot est inséré en une fois ; en cas de conflit, chaque ligne est
+        reprise séparément : une transaction dont le transaction_id existe
+        déjà est retournée telle quelle au lieu d'être recréée, une référence
+        déjà utilisée reste une erreur.
+        """
+        try:
+            with self.env.cr.savepoint():
+                return super().create(vals_list)
+        except UniqueViolation:
+            pass
 
-            # Générer la facture PDF de manière asynchrone pour éviter les blocages
+        records = self.browse()
+        for vals in vals_list:
             try:
-                self._generate_invoice_pdf()
-                _logger.info(f"Facture générée avec succès pour la transaction {self.transaction_id}")
-            except Exception as e:
-                _logger.error(f"Erreur lors de la génération de la facture pour la transaction {self.transaction_id}: {str(e)}")
+                with self.env.cr.savepoint():
+                    records |= super().create([vals])
+            except UniqueViolation:
+                existing = self.search([('transaction_id', '=', vals.get('transaction_id'))], limit=1)
+                if not existing:
+                    raise ValidationError(f"Une transaction avec la référence '{vals.get('reference')}' existe déjà.")
+                _logger.info(f"Transaction {vals.get('transaction_id')} déjà enregistrée, réutilisation de {existing.id}")
+                records |= existing
+        return records
 
-                # Créer le paiement et relier la facture
-            try:
-                self._create_payment_and_link_invoice()
-                _logger.info(f"Paiement et facture créés avec succès pour la transaction {self.transaction_id}")
-            except Exception as e:
-                _logger.error(f"Erreur lors de la création du paiement et de la facture pour la transaction {self.transaction_id}: {str(e)}")
+    @api.model
+    def _wave_session_status(self, session_data):
+        """Déterminer le statut Odoo à partir de checkout_status et payment_status"""
+        return session_status(session_data)
 
+    @api.model
+    def _raw_status_vals(self, session_data):
+        """Statuts Wave bruts d'une session, limités aux valeurs des champs de sélection.
 
-            return result
+        Les valeurs absentes, nulles ou inconnues sont omises plutôt que
+        de faire échouer l'écriture.
+        """
+        vals = {}
+        for name, value in zip(('checkout_status', 'payment_status'), raw_statuses(session_data)):
+            if value in dict(self._fields[name].selection):
+                vals[name] = value
+        return vals
 
-        return super().write(vals)
+    @api.model
+    def _import_wave_sessions(self, sessions, batch_size=500):
+        """Importer des sessions Wave historiques (données brutes de l'API).
+
+        Les sessions déjà connues (même wave_id, transaction_id ou référence)
+        sont ignorées ; les autres sont créées par lots, sans déclencher
+        facture ni paiement. Si un lot entre en conflit, ses lignes sont
+        reprises une à une et celles en conflit sont ignorées.
+        Retourne les transactions créées.
+        """
+        sessions = [session for session in sessions if session.get('id')]
+        client_references = [session.get('client_reference') or session['id'] for session in sessions]
+        known = self.with_context(active_test=False).search(['|', '|',
+            ('wave_id', 'in', [session['id'] for session in sessions]),
+            ('transaction_id', 'in', client_references),
+            ('reference', 'in', client_references),
+        ])
+        existing = set(known.mapped('wave_id'))
+        references = set(known.mapped('transaction_id')) | set(known.mapped('reference'))
+
+        created = self.browse()
+        vals_list = []
+        for session in sessions:
+            client_reference = session.get('client_reference') or session['id']
+            if session['id'] in existing or client_reference in references:
+                _logger.info(f"Session Wave {session['id']} ignorée : déjà importée")
+                continue
+            existing.add(session['id'])
+            references.add(client_reference)
+            vals_list.append({
+                'wave_id': session['id'],
+                'transaction_id': client_reference,
+                'reference': client_reference,
+                'amount': float(session.get('amount') or 0),
+                'currency': session.get('currency') or 'XOF',
+                'status': self._wave_session_status(session),
+                **self._raw_status_vals(session),
+                'payment_link_url': session.get('wave_launch_url'),
+                'created_at': self._parse_wave_date(session.get('when_created')) or fields.Datetime.now(),
+                'completed_at': self._parse_wave_date(session.get('when_completed')),
+                'wave_response': json.dumps(session),
+            })
+            if len(vals_list) >= batch_size:
+                created |= self._import_wave_batch(vals_list)
+                vals_list = []
+        if vals_list:
+            created |= self._import_wave_batch(vals_list)
+        _logger.info(f"{len(created)} session(s) Wave importée(s), {len(sessions) - len(created)} ignorée(s)")
+        return created
 
     @api.model
-    def create(self, vals):
-        """Surcharger create pour ajouter des validations"""
-        # Vérifier l'unicité du transaction_id
-        if vals.get('transaction_id'):
-            existing = self.search([('transaction_id', '=', vals['transaction_id'])])
-            if existing:
-                raise ValidationError(f"Une transaction avec l'ID '{vals['transaction_id']}' existe déjà.")
+    def _import_wave_batch(self, vals_list):
+        """Créer un lot de sessions importées ; retourner les seules transactions nouvelles.
 
-        # Vérifier l'unicité de la référence
-        if vals.get('reference'):
-            existing = self.search([('reference', '=', vals['reference'])])
-            if existing:
-                raise ValidationError(f"Une transaction avec la référence '{vals['reference']}' existe déjà.")
+        create() peut retourner une transaction existante (même transaction_id)
+        ou lever une erreur (référence déjà utilisée) : une ligne en conflit
+        est alors ignorée sans annuler le reste du lot.
+        """
+        wave_ids = {vals['wave_id'] for vals in vals_list}
+        try:
+            with self.env.cr.savepoint():
+                return self.create(vals_list).filtered(lambda t: t.wave_id in wave_ids)
+        except (UniqueViolation, ValidationError):
+            pass
 
-        return super().create(vals)
+        created = self.browse()
+        for vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    record = self.create([vals])
+            except (UniqueViolation, ValidationError) as e:
+                _logger.warning(f"Session Wave {vals['wave_id']} ignorée : {e}")
+                continue
+            if record.wave_id != vals['wave_id']:
+                _logger.warning(f"Session Wave {vals['wave_id']} ignorée : transaction {vals['transaction_id']} déjà enregistrée")
+                continue
+            created |= record
+        return created
 
+    @api.model
+    def _parse_wave_date(self, iso_date):
+        """Convertir une date ISO 8601 de Wave (UTC) en datetime naïf"""
+        if not iso_date:
+            return False
+        try:
+            return datetime.fromisoformat(iso_date.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            return False
 
     def action_refresh_status(self):
-        """Action pour rafraîchir le statut depuis Wave"""
+        """Action pour rafraîchir le statut depuis Wave (une ou plusieurs transactions)"""
         try:
             config = self.env['wave.config'].search([('is_active', '=', True)], limit=1)
             if not config:
                 raise ValidationError("Aucune configuration Wave active trouvée.")
-            # Utiliser la méthode du modèle pour récupérer la session
-            session_data = config.get_session_by_id(self.wave_id)
-            _logger.info(f"Wave session data: {session_data}")
-            if session_data:
-                # Vérifier checkout_status et payment_status
-                checkout_status = session_data.get('checkout_status', '').lower()
-                payment_status = session_data.get('payment_status', '').lower()
-                self.write({
-                    'checkout_status': checkout_status,
-                    'payment_status': payment_status
-                })
-                # Déterminer le statut en fonction des deux champs
-                if checkout_status == 'complete' and payment_status == 'succeeded':
-                    wave_status = 'completed'
-                elif checkout_status == 'failed' or payment_status == 'failed':
-                    wave_status = 'failed'
-                elif checkout_status == 'cancelled' or payment_status == 'cancelled':
-                    wave_status = 'cancelled'
-                elif checkout_status == 'expired':
-                    wave_status = 'expired'
-                else:
-                    wave_status = 'pending'
-                # Mapper le statut Wave vers Odoo
-                status_mapping = {
-                    'completed': 'completed',
-                    'succeeded': 'completed',
-                    'failed': 'failed',
-                    'cancelled': 'cancelled',
-                    'canceled': 'cancelled',
-                    'pending': 'pending',
-                    'processing': 'pending',
-                    'expired': 'expired'
-                }
-                new_status = status_mapping.get(wave_status, 'pending')
-                if new_status != self.status:
-                    _logger.info(f"Updating status from manual refresh for transaction {self.id} to {new_status}")
-                    self.write({
-                        'status': new_status,
-                        'wave_response': json.dumps(session_data),
-                    })
+            # Récupérer toutes les sessions en parallèle
+            sessions = config.get_sessions_bulk(self.mapped('wave_id'))
+
+            missing = self.filtered(lambda t: not sessions.get(t.wave_id))
+            updated = (self - missing)._apply_sessions_data(sessions)
+
+            if len(self) == 1:
+                if missing:
+                    raise ValidationError("Impossible de récupérer les données de la session Wave")
+                if updated:
                     return {
                         'type': 'ir.actions.client',
                         'tag': 'display_notification',
                         'params': {
                             'title': 'Statut mis à jour',
-                            'message': f'Le statut a été mis à jour: {new_status}',
+                            'message': f'Le statut a été mis à jour: {self.status}',
                             'type': 'success',
                         }
                     }
-            else:
-                raise ValidationError("Impossible de récupérer les données de la session Wave")
+                return False
+
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Statuts mis à jour',
+                    'message': f'{len(updated)} transaction(s) mise(s) à jour sur {len(self)}, {len(missing)} session(s) introuvable(s).',
+                    'type': 'warning' if missing else 'success',
+                }
+            }
         except Exception as e:
             return {
                 'type': 'ir.actions.client',
@@ -601,12 +956,55 @@ class WaveTransaction(models.Model):
                 }
             }
 
+    def _apply_session_data(self, session_data):
+        """Appliquer les données d'une session Wave à la transaction.
+
+        Retourne True si le statut de la transaction a changé.
+        """
+        self.ensure_one()
+        return bool(self._apply_sessions_data({self.wave_id: session_data}))
+
+    def _apply_sessions_data(self, sessions):
+        """Appliquer en lot les sessions Wave ``{wave_id: données}`` aux transactions.
+
+        Les statuts sont classés en un appel par le moteur de transitions
+        (les régressions, par exemple completed -> pending, sont ignorées),
+        puis écrits par groupe. Retourne les transactions dont le statut a changé.
+        """
+        items = [(t.id, t.status, sessions[t.wave_id]) for t in self if sessions.get(t.wave_id)]
+        changes, rejected = classify_sessions(items)
+        for transaction_id, new_status in rejected.items():
+            _logger.warning(f"Transition vers {new_status} refusée pour la transaction {transaction_id}")
+
+        # Statuts Wave bruts des transitions acceptées, regroupés par valeurs identiques
+        raw_groups = {}
+        for transaction_id, current_status, session_data in items:
+            if transaction_id in rejected:
+                continue
+            raw = tuple(sorted(self._raw_status_vals(session_data).items()))
+            if raw:
+                raw_groups.setdefault(raw, []).append(transaction_id)
+        for raw, ids in raw_groups.items():
+            self.browse(ids).write(dict(raw))
+
+        updated = self.browse()
+        for new_status, ids in changes.items():
+            records = self.browse(ids)
+            _logger.info(f"Updating status from manual refresh for transactions {ids} to {new_status}")
+            records.write({'status': new_status})
+            updated |= records
+        self.env['wave.transaction.payload'].sudo()._append([
+            (transaction.id, 'response', json.dumps(sessions[transaction.wave_id])) for transaction in updated
+        ])
+        updated.invalidate_recordset(['wave_response', 'payload_ids'])
+        return updated
+
     def action_download_invoice(self):
         """Action pour télécharger la facture PDF"""
-        if self.facture_pdf:
+        if self.url_facture:
             return {
                 'type': 'ir.actions.act_url',
-                'url': f'/web/content?model={self._name}&id={self.id}&field=facture_pdf&filename_field=facture_filename&download=true',
+                'url': f'{self.url_facture}&download=true',
                 'target': 'self',
             }
         else:
@@ -640,7 +1038,20 @@ class WaveTransaction(models.Model):
             }
 
     def action_regenerate_invoice(self):
-        """Action pour régénérer la facture manuellement"""
+        """Action pour régénérer la facture manuellement (une ou plusieurs transactions)"""
+        if len(self) > 1:
+            completed = self.filtered(lambda t: t.status == 'completed')
+            results = completed._generate_invoice_pdfs()
+            generated = len([url for url in results.values() if url])
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Factures régénérées',
+                    'message': f'{generated} facture(s) régénérée(s) sur {len(completed)} transaction(s) complétée(s).',
+                    'type': 'success' if generated == len(completed) else 'warning',
+                }
+            }
         if self.status == 'completed':
             try:
                 url_facture = self._generate_invoice_pdf()
@@ -834,6 +1245,90 @@ class WaveTransaction(models.Model):
 
 
 
+    def _create_payment_transaction(self):
+        """Créer le paiement de la commande pour une transaction complétée via webhook"""
+        self.ensure_one()
+        try:
+            env = self.env
+            if env.user._is_public():
+                env = env(user=env.ref('base.user_admin').id)
+            transaction = self.with_env(env)
+            order = transaction.order_id
+            company = order.company_id
+            partner = order.partner_id
+            amount = transaction.amount
+
+            journal = env['account.journal'].sudo().search([('code', '=', 'CSH1'), ('company_id', '=', company.id)], limit=1)
+            _logger.info("journal: %s", journal)
+            payment_method = env['account.payment.method'].sudo().search([('payment_type', '=', 'inbound')], limit=1)
+            _logger.info("payment_method: %s", payment_method)
+
+            if not journal:
+                journal = env['account.journal'].sudo().search([('type', 'in', ['cash', 'bank']), ('company_id', '=', company.id)], limit=1)
+
+            if not payment_method:
+                payment_method = env['account.payment.method'].sudo().search([('payment_type', '=', 'inbound')], limit=1)
+
+            if not company:
+                company = env['res.company'].sudo().search([('id', '=', 1)], limit=1)
+
+            if order and order.type_sale == 'order':
+                order.action_confirm()
+
+            try:
+                if order.advance_payment_status != 'paid':
+                    payment_vals = {
+                        'payment_type': 'inbound',
+                        'partner_type': 'customer',
+                        'partner_id': partner.id,
+                        'amount': amount,
+                        'journal_id': journal.id,
+                        'currency_id': journal.currency_id.id,
+                        'payment_method_line_id': 1,
+                        'payment_method_id': payment_method.id,
+                        'ref': order.name,
+                        'sale_id': order.id,
+                        'is_reconciled': True,
+                    }
+                    account_payment = env['account.payment'].sudo().create(payment_vals)
+                    if account_payment:
+                        account_payment.action_post()
+                        if order and order.type_sale == 'creditorder':
+                            order.action_confirm()
+
+                        _logger.info(f"Payment created for transaction {transaction.transaction_id}")
+                        return True
+                    else:
+                        return False
+            except Exception as e:
+                _logger.error(f"Error creating payment: {str(e)}")
+                return False
+
+        except Exception as e:
+            _logger.error(f"Error handling completed payment: {str(e)}")
+            return False
+
+    @api.model
+    def _cron_expire_stale_sessions(self):
+        """Expirer en une seule instruction les transactions restées en attente trop longtemps"""
+        config = self.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
+        expiry_minutes = config.session_expiry_minutes if config else 60
+        if expiry_minutes <= 0:
+            return True
+        self.env.cr.execute("""
+            UPDATE wave_transaction
+               SET status = 'expired',
+                   checkout_status = 'expired',
+                   updated_at = (now() AT TIME ZONE 'UTC')
+             WHERE status = 'pending'
+               AND created_at < (now() AT TIME ZONE 'UTC') - %s * interval '1 minute'
+        """, (expiry_minutes,))
+        count = self.env.cr.rowcount
+        if count:
+            self.invalidate_model(['status', 'checkout_status', 'updated_at'])
+            _logger.info(f"{count} transaction(s) Wave en attente depuis plus de {expiry_minutes} minutes expirée(s)")
+        return True
+
     _sql_constraints = [
         ('transaction_id_unique', 'UNIQUE(transaction_id)', 'L\'ID de transaction doit être unique.'),
         ('reference_unique', 'UNIQUE(reference)', 'La référence doit être unique.'),
@@ -0,0 +1,222 @@
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools.misc import hmac as hmac_tool
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from ..tools.receipt_pdf import render_receipt
+from ..tools.wave_status import TERMINAL_STATUSES
+from .wave_transaction import INVOICE_TOKEN_SCOPE
+
+_logger = logging.getLogger(__name__)
+
+# Champs copiés tels quels de wave.transaction vers l'archive (colonnes interrogeables)
+INDEXED_FIELDS = ('wave_id', 'transaction_id', 'reference', 'status', 'amount', 'currency',
+                  'created_at', 'completed_at', 'url_facture')
+
+
+class WaveTransactionArchive(models.Model):
+    _name = 'wave.transaction.archive'
+    _description = 'Archive des transactions Wave'
+    _order = 'created_at desc'
+    _rec_name = 'reference'
+
+    # Table froide : quelques colonnes indexées pour la recherche, le reste de la
+    # transaction (et l'historique de ses échanges avec Wave) dans un bloc compressé
+    original_id = fields.Integer(string="ID d'origine", index=True, readonly=True)
+    wave_id = fields.Char(string="ID Wave", index=True, readonly=True)
+    transaction_id = fields.Char(string="ID de transaction", index=True, readonly=True)
+    reference = fields.Char(string="Référence", index=True, readonly=True)
+    partner_id = fields.Many2one('res.partner', string="Client", index=True, ondelete='set null', readonly=True)
+    order_id = fields.Many2one('sale.order', string="Commande liée", ondelete='set null', readonly=True)
+    status = fields.Char(string="Statut", readonly=True)
+    amount = fields.Float(string="Montant", digits=(16, 2), readonly=True)
+    currency = fields.Char(string="Devise", readonly=True)
+    url_facture = fields.Char(string="URL de la facture", readonly=True)
+    created_at = fields.Datetime(string="Date de création", readonly=True)
+    completed_at = fields.Datetime(string="Date de completion", readonly=True)
+    archived_at = fields.Datetime(string="Date d'archivage", default=fields.Datetime.now, readonly=True)
+
+    data = fields.Binary(
+        string="Données compressées",
+        attachment=False,
+        readonly=True,
+        help="Transaction complète et historique des échanges Wave (JSON compressé zlib, stocké brut)"
+    )
+
+    content = fields.Text(
+        string="Contenu",
+        compute='_compute_content'
+    )
+
+    def _compute_content(self):
+        for record in self:
+            record.content = json.dumps(record._get_snapshot(), indent=2, ensure_ascii=False)
+
+    def _get_snapshot(self):
+        """Décompresser la transaction archivée"""
+        self.ensure_one()
+        if not self.data:
+            return {}
+        return json.loads(zlib.decompress(self.data).decode('utf-8'))
+
+    def _get_invoice_access_token(self):
+        """Jeton de la transaction d'origine : les liens de facture déjà envoyés restent valables"""
+        self.ensure_one()
+        return hmac_tool(self.env(su=True), INVOICE_TOKEN_SCOPE, self.original_id)
+
+    def _get_invoice_attachment(self):
+        """Retourner la facture PDF de la transaction archivée.
+
+        La facture déplacée avec la transaction est servie telle quelle. Un
+        reçu jamais consulté avant l'archivage est rendu à la demande depuis
+        l'instantané, avec le moteur PDF natif (la transaction n'existe plus
+        pour le modèle QWeb).
+        """
+        self.ensure_one()
+        Attachment = self.env['ir.attachment'].sudo()
+        domain = [('res_model', '=', self._name), ('res_id', '=', self.id), ('mimetype', '=', 'application/pdf')]
+        attachment = Attachment.search(domain, order='id desc', limit=1)
+        if attachment or not self.completed_at:
+            return attachment
+
+        # Deux téléchargements simultanés ne produisent qu'une pièce jointe
+        self.env.cr.execute("SELECT id FROM wave_transaction_archive WHERE id = %s FOR UPDATE", (self.id,))
+        attachment = Attachment.search(domain, order='id desc', limit=1)
+        if attachment:
+            return attachment
+        pdf_content = render_receipt(self._get_receipt_values())
+        return Attachment.create({
+            'name': f"facture_wave_{self.transaction_id}.pdf",
+            'type': 'binary',
+            'raw': pdf_content,
+            'res_model': self._name,
+            'res_id': self.id,
+            'mimetype': 'application/pdf',
+        })
+
+    def _get_receipt_values(self):
+        """Contenu du reçu reconstitué depuis l'instantané archivé"""
+        self.ensure_one()
+        snapshot = self._get_snapshot()
+        order = snapshot.get('order_id')
+        Transaction = self.env['wave.transaction']
+        return Transaction._build_receipt_values({
+            'id': self.original_id,
+            'reference': self.reference,
+            'transaction_id': self.transaction_id,
+            'wave_id': self.wave_id,
+            'phone': snapshot.get('phone'),
+            'description': snapshot.get('description'),
+            'order_name': order[1] if order else False,
+            'partner_name': self.partner_id.name,
+            'partner_email': self.partner_id.email,
+            'formatted_amount': Transaction._format_amount(self.amount, self.currency),
+            'completed_at': self.completed_at,
+        })
+
+    def write(self, vals):
+        raise UserError("Les transactions archivées ne peuvent pas être modifiées.")
+
+    @api.model
+    def _snapshot_vals(self, transaction):
+        """Valeurs d'archive d'une transaction, avec le bloc compressé"""
+        snapshot = transaction.read([
+            name for name, field in transaction._fields.items()
+            if field.store and field.type not in ('one2many', 'many2many', 'binary')
+        ])[0]
+        snapshot['payloads'] = [{
+            'kind': payload.kind,
+            'created_at': payload.created_at,
+            'content': payload.content,
+        } for payload in transaction.payload_ids]
+        vals = {name: transaction[name] for name in INDEXED_FIELDS}
+        vals.update({
+            'original_id': transaction.id,
+            'partner_id': transaction.partner_id.id,
+            'order_id': transaction.order_id.id,
+            'data': zlib.compress(json.dumps(snapshot, default=str).encode('utf-8')),
+        })
+        return vals
+
+    @api.model
+    def _cron_archive_transactions(self, batch_size=500):
+        """Déplacer vers l'archive les transactions définitives (TERMINAL_STATUSES) plus anciennes que le délai configuré"""
+        config = self.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
+        archive_after_days = config.archive_after_days if config else 0
+        if archive_after_days <= 0:
+            return True
+        cutoff = fields.Datetime.now() - timedelta(days=archive_after_days)
+        Transaction = self.env['wave.transaction'].sudo()
+        # Une transaction dont les tâches ne sont pas terminées reste dans la table active
+        busy_ids = self.env['wave.transaction.job'].sudo().search(
+            [('state', 'in', ('pending', 'running'))]
+        ).mapped('transaction_ref_id').ids
+        archived = 0
+        while True:
+            transactions = Transaction.search([
+                ('status', 'in', TERMINAL_STATUSES),
+                ('created_at', '<', cutoff),
+                ('id', 'not in', busy_ids),
+            ], order='id', limit=batch_size)
+            if not transactions:
+                break
+            archives = self.create([self._snapshot_vals(transaction) for transaction in transactions])
+            by_original = {archive.original_id: archive for archive in archives}
+
+            # Les pièces jointes (facture PDF) suivent la transaction dans l'archive
+            attachments = self.env['ir.attachment'].sudo().search([
+                ('res_model', '=', Transaction._name),
+                ('res_id', 'in', transactions.ids),
+            ])
+            for attachment in attachments:
+                attachment.write({'res_model': self._name, 'res_id': by_original[attachment.res_id].id})
+
+            transactions.unlink()
+            self.env.cr.commit()
+            archived += len(transactions)
+        if archived:
+            _logger.info(f"{archived} transaction(s) Wave archivée(s) (plus de {archive_after_days} jours)")
+        return True
+
+    @api.model
+    def _lookup(self, transaction_id=None, wave_id=None, reference=None):
+        """Rechercher une transaction archivée ; retourner un dictionnaire ou None"""
+        domain = []
+        for name, value in (('transaction_id', transaction_id), ('wave_id', wave_id), ('reference', reference)):
+            if value:
+                domain.append((name, '=', value))
+        if not domain:
+            return None
+        archive = self.sudo().search(domain, limit=1)
+        if not archive:
+            return None
+        return archive._to_dict()
+
+    def _to_dict(self):
+        self.ensure_one()
+        snapshot = self._get_snapshot()
+        return {
+            'transaction_id': self.transaction_id,
+            'custom_transaction_id': self.transaction_id,
+            'wave_id': self.wave_id,
+            'session_id': self.wave_id,
+            'reference': self.reference,
+            'status': self.status,
+            'checkout_status': snapshot.get('checkout_status'),
+            'payment_status': snapshot.get('payment_status'),
+            'amount': self.amount,
+            'currency': self.currency,
+            'phone': snapshot.get('phone'),
+            'description': snapshot.get('description'),
+            'order_id': self.order_id.id,
+            'partner_id': self.partner_id.id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'url_facture': self.url_facture,
+            'archived': True,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+        }
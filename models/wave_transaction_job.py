@@ -0,0 +1,211 @@
+
+from odoo import models, fields, api, registry, SUPERUSER_ID
+from odoo.tools.sql import create_index, drop_index
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+_logger = logging.getLogger(__name__)
+
+# Méthode de wave.transaction exécutée pour chaque type de tâche
+JOB_METHODS = {
+    'payment': '_create_payment_and_link_invoice',
+    'order_payment': '_create_payment_transaction',
+    'notification': '_notify_invoice_available',
+}
+
+# Au-delà de ce délai, une tâche restée 'running' est considérée comme abandonnée
+# (worker arrêté pendant l'exécution) et remise en attente
+STALE_JOB_MINUTES = 30
+
+
+class WaveTransactionJobError(Exception):
+    """Levée quand la méthode d'une tâche signale un échec"""
+
+
+class WaveTransactionJob(models.Model):
+    _name = 'wave.transaction.job'
+    _description = 'Tâche différée de transaction Wave'
+    _order = 'id desc'
+    _rec_name = 'job_type'
+
+    transaction_ref_id = fields.Many2one(
+        'wave.transaction',
+        string='Transaction',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        readonly=True
+    )
+
+    job_type = fields.Selection([
+        ('payment', 'Paiement et facture comptable'),
+        ('order_payment', 'Paiement de la commande'),
+        ('notification', 'Notification client')
+    ], string='Type', required=True, readonly=True)
+
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée')
+    ], string='État', default='pending', required=True, index=True, readonly=True)
+
+    attempts = fields.Integer(
+        string='Tentatives',
+        default=0,
+        readonly=True
+    )
+
+    error = fields.Text(
+        string='Erreur',
+        readonly=True
+    )
+
+    next_attempt_at = fields.Datetime(
+        string='Prochaine tentative',
+        readonly=True,
+        help="Une tâche en échec n'est pas reprise avant cette date"
+    )
+
+    started_at = fields.Datetime(
+        string='Début',
+        readonly=True
+    )
+
+    done_at = fields.Datetime(
+        string='Fin',
+        readonly=True
+    )
+
+    def init(self):
+        # Tâches à exécuter dont la date de reprise est atteinte, dans l'ordre de création
+        drop_index(self.env.cr, 'wave_transaction_job_pending_idx', self._table)
+        create_index(self.env.cr, 'wave_transaction_job_pending_next_idx', self._table,
+                     ['next_attempt_at', 'id'], where="state = 'pending'")
+
+    @api.model
+    def _enqueue(self, transactions, job_types):
+        """Créer les tâches des transactions et réveiller l'exécuteur.
+
+        Le déclencheur du cron n'est visible qu'après la validation de la
+        transaction courante : les tâches s'exécutent donc après le commit.
+        """
+        jobs = self.create([
+            {'transaction_ref_id': transaction.id, 'job_type': job_type}
+            for transaction in transactions
+            for job_type in job_types
+        ])
+        if jobs:
+            self._wake_runner()
+        return jobs
+
+    @api.model
+    def _wake_runner(self, at=None):
+        self.env.ref(f'{self._module}.ir_cron_run_wave_transaction_jobs')._trigger(at)
+
+    @api.model
+    def _claim(self, limit):
+        """Réserver des tâches en attente ; retourner leurs identifiants groupés par transaction"""
+        self.env.cr.execute("""
+            UPDATE wave_transaction_job
+               SET state = 'pending'
+             WHERE state = 'running'
+               AND started_at < (now() AT TIME ZONE 'UTC') - %s * interval '1 minute'
+        """, (STALE_JOB_MINUTES,))
+        # Les tâches d'une même transaction sont réservées ensemble, dans l'ordre de création ;
+        # une tâche en échec attend sa date de reprise
+        self.env.cr.execute("""
+            UPDATE wave_transaction_job
+               SET state = 'running',
+                   started_at = (now() AT TIME ZONE 'UTC')
+             WHERE id IN (
+                    SELECT id FROM wave_transaction_job
+                     WHERE state = 'pending'
+                       AND (next_attempt_at IS NULL OR next_attempt_at <= (now() AT TIME ZONE 'UTC'))
+                     ORDER BY id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+             )
+         RETURNING id, transaction_ref_id
+        """, (limit,))
+        rows = self.env.cr.fetchall()
+        self.env.cr.commit()
+        batches = {}
+        for job_id, transaction_id in sorted(rows):
+            batches.setdefault(transaction_id, []).append(job_id)
+        return list(batches.values())
+
+    @api.model
+    def _cron_run_jobs(self, limit=50):
+        """Exécuter les tâches en attente avec un nombre borné de threads"""
+        config = self.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
+        max_workers = max(config.job_max_workers, 1) if config else 2
+        batches = self._claim(limit)
+        if not batches:
+            return True
+
+        dbname = self.env.cr.dbname
+        context = dict(self.env.context)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix='wave_job') as executor:
+            # Les tâches d'une transaction s'exécutent en séquence dans un même thread
+            list(executor.map(lambda job_ids: self._run_in_thread(dbname, context, job_ids), batches))
+
+        if sum(len(job_ids) for job_ids in batches) == limit:
+            self._wake_runner()
+        return True
+
+    @api.model
+    def _run_in_thread(self, dbname, context, job_ids):
+        """Exécuter des tâches avec un curseur propre au thread"""
+        with registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, context)
+            for job in env['wave.transaction.job'].browse(job_ids):
+                job._run()
+                cr.commit()
+
+    def _run(self):
+        """Exécuter la tâche ; en cas d'échec, la replanifier ou l'abandonner"""
+        self.ensure_one()
+        method = JOB_METHODS[self.job_type]
+        try:
+            with self.env.cr.savepoint():
+                if getattr(self.transaction_ref_id, method)() is False:
+                    # Les méthodes historiques journalisent l'erreur et retournent False
+                    raise WaveTransactionJobError(f"{method} a échoué, voir les journaux du serveur")
+            self._mark_done()
+        except Exception as e:
+            self._mark_failed(e)
+        return True
+
+    def _mark_done(self):
+        self.write({
+            'state': 'done',
+            'attempts': self.attempts + 1,
+            'error': False,
+            'next_attempt_at': False,
+            'done_at': fields.Datetime.now(),
+        })
+
+    def _mark_failed(self, error):
+        """Replanifier la tâche, ou l'abandonner après le nombre maximal de tentatives"""
+        self.ensure_one()
+        attempts = self.attempts + 1
+        config = self.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
+        max_attempts = max(config.job_max_attempts, 1) if config else 3
+        _logger.error(f"Échec de la tâche {self.job_type} de la transaction {self.transaction_ref_id.id} "
+                      f"(tentative {attempts}/{max_attempts}) : {str(error)}")
+        if attempts >= max_attempts:
+            self.write({'state': 'failed', 'attempts': attempts, 'error': str(error), 'done_at': fields.Datetime.now()})
+        else:
+            next_attempt_at = fields.Datetime.now() + timedelta(minutes=attempts)
+            self.write({'state': 'pending', 'attempts': attempts, 'error': str(error), 'next_attempt_at': next_attempt_at})
+            self._wake_runner(next_attempt_at)
+
+    def action_retry(self):
+        """Relancer les tâches échouées"""
+        self.filtered(lambda job: job.state == 'failed').write({
+            'state': 'pending', 'attempts': 0, 'error': False, 'next_attempt_at': False,
+        })
+        self._wake_runner()
+        return True
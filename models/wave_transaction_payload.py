@@ -0,0 +1,101 @@
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+import zlib
+
+PAYLOAD_KINDS = [
+    ('response', 'Réponse API'),
+    ('webhook', 'Webhook'),
+]
+
+
+class WaveTransactionPayload(models.Model):
+    _name = 'wave.transaction.payload'
+    _description = 'Contenu brut reçu de Wave'
+    _order = 'id desc'
+    _rec_name = 'kind'
+
+    # Journal en ajout seul : chaque réponse ou webhook Wave ajoute une ligne,
+    # la transaction ne conserve que les champs extraits
+    transaction_ref_id = fields.Many2one(
+        'wave.transaction',
+        string='Transaction',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        readonly=True
+    )
+
+    kind = fields.Selection(
+        PAYLOAD_KINDS,
+        string='Type',
+        required=True,
+        readonly=True
+    )
+
+    data = fields.Binary(
+        string='Contenu compressé',
+        attachment=False,
+        readonly=True,
+        help="Contenu JSON compressé (zlib), stocké brut dans la colonne bytea"
+    )
+
+    content = fields.Text(
+        string='Contenu',
+        compute='_compute_content'
+    )
+
+    size = fields.Integer(
+        string='Taille (octets)',
+        readonly=True,
+        help="Taille du contenu avant compression"
+    )
+
+    created_at = fields.Datetime(
+        string='Date de réception',
+        default=fields.Datetime.now,
+        readonly=True
+    )
+
+    @api.model
+    def _compress(self, content):
+        return zlib.compress(content.encode('utf-8'))
+
+    @api.model
+    def _decompress(self, data):
+        if not data:
+            return False
+        return zlib.decompress(data).decode('utf-8')
+
+    def _compute_content(self):
+        for record in self:
+            record.content = self._decompress(record.data)
+
+    @api.model
+    def _append(self, entries):
+        """Ajouter des contenus ``[(id de transaction, type, texte)]`` en une seule insertion"""
+        return self.create([{
+            'transaction_ref_id': transaction_id,
+            'kind': kind,
+            'data': self._compress(content),
+            'size': len(content.encode('utf-8')),
+        } for transaction_id, kind, content in entries if content])
+
+    @api.model
+    def _get_latest(self, transaction_ids, kind):
+        """Retourner {id de transaction: dernier contenu du type donné}"""
+        if not transaction_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (transaction_ref_id) transaction_ref_id, data
+              FROM wave_transaction_payload
+             WHERE transaction_ref_id IN %s AND kind = %s
+             ORDER BY transaction_ref_id, id DESC
+        """, (tuple(transaction_ids), kind))
+        return {
+            transaction_id: self._decompress(bytes(data))
+            for transaction_id, data in self.env.cr.fetchall()
+        }
+
+    def write(self, vals):
+        raise UserError("Les contenus reçus de Wave ne peuvent pas être modifiés.")
@@ -0,0 +1,87 @@
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class WaveWebhookDeadLetter(models.Model):
+    _name = 'wave.webhook.dead.letter'
+    _description = 'Webhook Wave en échec'
+    _order = 'dead_at desc'
+    _rec_name = 'event_type'
+
+    event_ref_id = fields.Many2one(
+        'wave.webhook.event',
+        string='Événement',
+        required=True,
+        ondelete='cascade',
+        index=True,
+        readonly=True
+    )
+
+    event_type = fields.Char(
+        related='event_ref_id.event_type',
+        string="Type d'événement"
+    )
+
+    session_id = fields.Char(
+        related='event_ref_id.session_id',
+        string="ID de session Wave"
+    )
+
+    payload = fields.Text(
+        related='event_ref_id.payload',
+        string="Contenu brut"
+    )
+
+    error = fields.Text(
+        string="Dernière erreur",
+        readonly=True
+    )
+
+    attempts = fields.Integer(
+        string="Tentatives",
+        readonly=True
+    )
+
+    state = fields.Selection([
+        ('dead', 'En échec'),
+        ('replayed', 'Rejoué')
+    ], string='État', default='dead', required=True, index=True, readonly=True)
+
+    dead_at = fields.Datetime(
+        string="Date d'abandon",
+        default=fields.Datetime.now,
+        readonly=True
+    )
+
+    replayed_at = fields.Datetime(
+        string="Date de rejeu",
+        readonly=True
+    )
+
+    @api.model
+    def _record(self, event):
+        """Enregistrer un événement ayant épuisé ses tentatives"""
+        _logger.error(f"Webhook Wave {event.id} abandonné après {event.attempts} tentatives : {event.error}")
+        return self.create({
+            'event_ref_id': event.id,
+            'error': event.error,
+            'attempts': event.attempts,
+        })
+
+    def action_replay(self):
+        """Remettre les événements en échec dans la file de traitement"""
+        to_replay = self.filtered(lambda letter: letter.state == 'dead')
+        # Marque aussi les entrées comme rejouées
+        to_replay.event_ref_id.action_reprocess()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Rejeu des webhooks',
+                'message': f'{len(to_replay)} webhook(s) remis dans la file de traitement',
+                'type': 'success',
+            }
+        }
@@ -0,0 +1,498 @@
+
+from odoo import models, fields, api
+import hashlib
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+
+from psycopg2 import IntegrityError, errorcodes
+from psycopg2.extras import execute_values
+
+from odoo.tools.sql import create_index
+
+from ..tools.wave_status import classify_batch, map_status, raw_statuses
+
+_logger = logging.getLogger(__name__)
+
+# Erreurs de concurrence PostgreSQL : l'événement est rejoué sans compter de tentative
+TRANSIENT_PGCODES = (
+    errorcodes.SERIALIZATION_FAILURE,
+    errorcodes.DEADLOCK_DETECTED,
+    errorcodes.LOCK_NOT_AVAILABLE,
+)
+# Délai avant de rejouer un événement après une erreur de concurrence (secondes)
+TRANSIENT_RETRY_DELAY = 5
+
+
+def _is_transient(error):
+    return getattr(error, 'pgcode', None) in TRANSIENT_PGCODES
+
+
+class WaveWebhookError(Exception):
+    """Levée quand un effet de bord du webhook signale un échec (annule son point de sauvegarde)"""
+
+
+class WaveWebhookEvent(models.Model):
+    _name = 'wave.webhook.event'
+    _description = 'Événement webhook Wave'
+    _order = 'id desc'
+    _rec_name = 'event_type'
+
+    event_id = fields.Char(
+        string="ID de l'événement",
+        index=True,
+        readonly=True,
+        help="Identifiant de l'événement fourni par Wave"
+    )
+
+    # Indexé par la contrainte d'unicité dedup_key_unique
+    dedup_key = fields.Char(
+        string="Clé de déduplication",
+        readonly=True,
+        copy=False,
+        help="Identifiant de l'événement, ou empreinte SHA-256 du contenu à défaut"
+    )
+
+    event_type = fields.Char(
+        string="Type d'événement",
+        readonly=True
+    )
+
+    session_id = fields.Char(
+        string="ID de session Wave",
+        index=True,
+        readonly=True
+    )
+
+    payload = fields.Text(
+        string="Contenu brut",
+        readonly=True,
+        help="Corps de la requête webhook tel que reçu"
+    )
+
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('done', 'Traité'),
+        ('failed', 'Échoué')
+    ], string='État', default='pending', required=True, index=True, readonly=True,
+        help="Un événement échoué a épuisé ses tentatives et figure dans les webhooks en échec")
+
+    result = fields.Text(
+        string="Résultat",
+        readonly=True,
+        help="Résultat du traitement de l'événement"
+    )
+
+    error = fields.Text(
+        string="Erreur",
+        readonly=True
+    )
+
+    attempts = fields.Integer(
+        string="Tentatives",
+        default=0,
+        readonly=True
+    )
+
+    next_attempt_at = fields.Datetime(
+        string="Prochaine tentative",
+        readonly=True,
+        help="Date à partir de laquelle l'événement en attente sera de nouveau traité"
+    )
+
+    received_at = fields.Datetime(
+        string="Date de réception",
+        default=fields.Datetime.now,
+        readonly=True
+    )
+
+    processed_at = fields.Datetime(
+        string="Date de traitement",
+        readonly=True
+    )
+
+    _sql_constraints = [
+        ('dedup_key_unique', 'UNIQUE(dedup_key)', 'Cet événement webhook Wave a déjà été reçu.'),
+    ]
+
+    def init(self):
+        # File d'attente : seuls les événements en attente sont parcourus par le processeur
+        create_index(self.env.cr, 'wave_webhook_event_pending_idx', self._table,
+                     ['next_attempt_at', 'id'], where="state = 'pending'")
+
+    @api.model
+    def _get_dedup_key(self, body, webhook_data):
+        """Clé identifiant une livraison : l'ID Wave de l'événement, sinon l'empreinte du contenu"""
+        event_id = webhook_data.get('id')
+        if event_id:
+            return str(event_id)
+        return 'sha256:' + hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+    @api.model
+    def _find_duplicate(self, dedup_key):
+        """Rechercher un événement déjà reçu (une seule lecture sur l'index unique)"""
+        self.env.cr.execute("SELECT id FROM wave_webhook_event WHERE dedup_key = %s", (dedup_key,))
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    @api.model
+    def _enqueue(self, body, webhook_data):
+        """Enregistrer un webhook reçu dans la file et réveiller le processeur.
+
+        Retourne (événement, doublon) : une nouvelle livraison d'un événement
+        déjà reçu n'est pas remise en file et renvoie l'événement d'origine.
+        """
+        dedup_key = self._get_dedup_key(body, webhook_data)
+        duplicate = self._find_duplicate(dedup_key)
+        if duplicate:
+            _logger.info(f"Webhook Wave {dedup_key} déjà reçu (événement {duplicate.id}), livraison ignorée")
+            return duplicate, True
+
+        try:
+            with self.env.cr.savepoint():
+                event = self.create({
+                    'dedup_key': dedup_key,
+                    'event_id': webhook_data.get('id'),
+                    'event_type': webhook_data.get('type') or webhook_data.get('event'),
+                    'session_id': (webhook_data.get('data') or {}).get('id'),
+                    'payload': body,
+                })
+        except IntegrityError:
+            # Livraison concurrente du même événement : l'autre requête l'a enregistré
+            return self._find_duplicate(dedup_key), True
+
+        self._wake_processor()
+        return event, False
+
+    def _get_result(self):
+        """Résultat enregistré du traitement, ou None tant que l'événement n'est pas traité"""
+        self.ensure_one()
+        if self.state != 'done' or not self.result:
+            return None
+        return json.loads(self.result)
+
+    @api.model
+    def _cron_process_pending(self, limit=100):
+        """Vider la file des webhooks en attente, par lots de ``limit`` événements"""
+        self.env.cr.execute("""
+            SELECT id FROM wave_webhook_event
+             WHERE state = 'pending'
+               AND (next_attempt_at IS NULL OR next_attempt_at <= (now() AT TIME ZONE 'UTC'))
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        events = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if not events:
+            return True
+        try:
+            with self.env.cr.savepoint():
+                events._process_batch()
+        except Exception as e:
+            if _is_transient(e):
+                # Conflit avec une autre transaction : abandonner le lot, il sera rejoué tel quel
+                _logger.info(f"Conflit de concurrence sur un lot de {len(events)} webhooks Wave, nouvel essai : {str(e)}")
+                self.env.cr.rollback()
+                self._wake_processor(fields.Datetime.now() + timedelta(seconds=TRANSIENT_RETRY_DELAY))
+                return True
+            # Un événement du lot a échoué : retraiter un par un pour isoler le fautif
+            _logger.warning(f"Échec du traitement groupé de {len(events)} webhooks Wave, traitement unitaire : {str(e)}")
+            events._process()
+        # Une seule transaction par lot
+        self.env.cr.commit()
+        if len(events) == limit:
+            self._wake_processor()
+        return True
+
+    @api.model
+    def _wake_processor(self, at=None):
+        """Réveiller le processeur de la file, immédiatement ou à la date donnée"""
+        self.env.ref(f'{self._module}.ir_cron_process_wave_webhook_events')._trigger(at)
+
+    @api.model
+    def _get_retry_policy(self):
+        """Retourner (tentatives maximales, délai initial, délai maximal) des rejeux"""
+        config = self.env['wave.config'].sudo().search([('is_active', '=', True)], limit=1)
+        if not config:
+            return 8, 30, 3600
+        return (
+            max(config.webhook_max_attempts, 1),
+            max(config.webhook_retry_delay, 1),
+            max(config.webhook_retry_max_delay, config.webhook_retry_delay, 1),
+        )
+
+    @api.model
+    def _compute_retry_delay(self, attempts, base_delay, max_delay):
+        """Délai exponentiel plafonné avec gigue : entre la moitié et la totalité du palier"""
+        delay = min(max_delay, base_delay * 2 ** max(attempts - 1, 0))
+        return random.uniform(delay / 2, delay)
+
+    def _process_batch(self):
+        """Traiter un lot d'événements avec des lectures et écritures groupées"""
+        results = self._process_wave_webhooks_batch(
+            [(event.id, json.loads(event.payload)) for event in self]
+        )
+        execute_values(self.env.cr, """
+            UPDATE wave_webhook_event e
+               SET state = 'done',
+                   result = v.result,
+                   error = NULL,
+                   attempts = e.attempts + 1,
+                   next_attempt_at = NULL,
+                   processed_at = (now() AT TIME ZONE 'UTC')
+              FROM (VALUES %s) AS v(id, result)
+             WHERE e.id = v.id
+        """, [(event_id, json.dumps(result)) for event_id, result in results.items()])
+        self.invalidate_recordset(['state', 'result', 'error', 'attempts', 'next_attempt_at', 'processed_at'])
+        return True
+
+    def _process(self):
+        """Traiter l'événement en appliquant la logique du webhook Wave"""
+        for event in self:
+            try:
+                with self.env.cr.savepoint():
+                    result = self._process_wave_webhook(json.loads(event.payload))
+                event.write({
+                    'state': 'done',
+                    'result': json.dumps(result),
+                    'error': False,
+                    'attempts': event.attempts + 1,
+                    'next_attempt_at': False,
+                    'processed_at': fields.Datetime.now(),
+                })
+            except Exception as e:
+                event._handle_failure(e)
+        return True
+
+    def _handle_failure(self, error):
+        """Planifier un nouvel essai de l'événement, ou l'envoyer dans les webhooks en échec"""
+        self.ensure_one()
+        now = fields.Datetime.now()
+        if _is_transient(error):
+            _logger.info(f"Conflit de concurrence sur le webhook Wave {self.id}, nouvel essai : {str(error)}")
+            next_attempt_at = now + timedelta(seconds=random.uniform(1, TRANSIENT_RETRY_DELAY))
+            self.write({'next_attempt_at': next_attempt_at})
+            self._wake_processor(next_attempt_at)
+            return
+
+        _logger.exception(f"Erreur lors du traitement du webhook Wave {self.id}: {str(error)}")
+        attempts = self.attempts + 1
+        max_attempts, base_delay, max_delay = self._get_retry_policy()
+        if attempts >= max_attempts:
+            self.write({
+                'state': 'failed',
+                'error': str(error),
+                'attempts': attempts,
+                'next_attempt_at': False,
+                'processed_at': now,
+            })
+            self.env['wave.webhook.dead.letter'].sudo()._record(self)
+            return
+
+        next_attempt_at = now + timedelta(seconds=self._compute_retry_delay(attempts, base_delay, max_delay))
+        self.write({
+            'error': str(error),
+            'attempts': attempts,
+            'next_attempt_at': next_attempt_at,
+        })
+        self._wake_processor(next_attempt_at)
+
+    def action_reprocess(self):
+        """Remettre les événements dans la file de traitement"""
+        self.write({'state': 'pending', 'error': False, 'attempts': 0, 'next_attempt_at': False})
+        self.env['wave.webhook.dead.letter'].sudo().search([
+            ('event_ref_id', 'in', self.ids), ('state', '=', 'dead'),
+        ]).write({'state': 'replayed', 'replayed_at': fields.Datetime.now()})
+        self._wake_processor()
+        return True
+
+    @api.model
+    def _cron_purge_processed(self):
+        """Supprimer les événements traités au-delà de la durée de conservation"""
+        configs = self.env['wave.config'].sudo().search([('is_active', '=', True)])
+        retention_days = max(configs.mapped('webhook_retention_days') or [30])
+        if retention_days <= 0:
+            return True
+        limit_date = fields.Datetime.now() - timedelta(days=retention_days)
+        self.env.cr.execute("""
+            DELETE FROM wave_webhook_event
+             WHERE state = 'done' AND received_at < %s
+        """, (limit_date,))
+        _logger.info(f"{self.env.cr.rowcount} événement(s) webhook Wave purgé(s) (conservation : {retention_days} jours)")
+        return True
+
+    @api.model
+    def _map_wave_status_to_odoo(self, checkout_status, payment_status):
+        return map_status(checkout_status, payment_status)
+
+    @api.model
+    def _get_webhook_handlers(self):
+        """Table de dispatch : type d'événement Wave -> méthode retournant le statut cible.
+
+        Chaque gestionnaire reçoit la session Wave portée par l'événement et
+        retourne le statut à appliquer à la transaction. Surcharger cette
+        méthode pour prendre en charge d'autres types d'événements.
+        """
+        return {
+            'checkout.session.completed': '_handle_session_completed',
+            'checkout.session.payment_failed': '_handle_session_payment_failed',
+            'checkout.session.expired': '_handle_session_expired',
+            'checkout.session.refunded': '_handle_session_refunded',
+        }
+
+    @api.model
+    def _handle_session_completed(self, session):
+        return self._map_wave_status_to_odoo(*raw_statuses(session))
+
+    @api.model
+    def _handle_session_payment_failed(self, session):
+        return 'failed'
+
+    @api.model
+    def _handle_session_expired(self, session):
+        return 'expired'
+
+    @api.model
+    def _handle_session_refunded(self, session):
+        return 'refunded'
+
+    @api.model
+    def _process_wave_webhook(self, webhook_data):
+        """Traiter un webhook isolé (lot d'un seul événement)"""
+        event_type = webhook_data.get('type') or webhook_data.get('event')
+        _logger.info(f"Processing Wave event: {event_type}")
+        return self._process_wave_webhooks_batch([(0, webhook_data)])[0]
+
+    @api.model
+    def _process_wave_webhooks_batch(self, items):
+        """Appliquer un lot de webhooks ``[(clé, données)]`` ; retourner {clé: résultat}.
+
+        Le statut cible de chaque événement est donné par son gestionnaire
+        (voir _get_webhook_handlers). Les événements d'une même session sont
+        appliqués dans l'ordre du lot : celui-ci est découpé en passes ne
+        contenant qu'un événement par session, de sorte qu'un paiement
+        complété puis remboursé passe bien par la complétion.
+        """
+        handlers = self._get_webhook_handlers()
+        results = {}
+        rounds = []
+        depth = {}
+        for key, webhook_data in items:
+            event_type = webhook_data.get('type') or webhook_data.get('event')
+            handler = handlers.get(event_type)
+            if not handler:
+                results[key] = {'success': False, 'error': 'Unhandled event'}
+                continue
+            session = webhook_data.get('data', {})
+            if not session.get('id'):
+                results[key] = {'success': False, 'error': 'Missing session ID'}
+                continue
+            index = depth.get(session['id'], 0)
+            depth[session['id']] = index + 1
+            if index == len(rounds):
+                rounds.append({})
+            rounds[index][session['id']] = (key, webhook_data, getattr(self, handler)(session))
+
+        for sessions in rounds:
+            results.update(self._apply_webhook_round(sessions))
+        return results
+
+    @api.model
+    def _apply_webhook_round(self, sessions):
+        """Appliquer une passe ``{session_id: (clé, données, statut cible)}`` ; retourner {clé: résultat}.
+
+        Les transactions sont résolues en une seule recherche, puis mises à
+        jour par groupe de statut cible.
+        """
+        results = {}
+        transactions = self.env['wave.transaction'].sudo().search([('wave_id', 'in', list(sessions))])
+        by_wave_id = {transaction.wave_id: transaction for transaction in transactions}
+
+        # Transitions de statut validées pour toute la passe en un appel
+        changes, rejected = classify_batch(
+            (session_id, by_wave_id[session_id].status, new_status)
+            for session_id, (key, webhook_data, new_status) in sessions.items()
+            if session_id in by_wave_id
+        )
+        accepted = {session_id: status for status, session_ids in changes.items() for session_id in session_ids}
+
+        groups = {}
+        payloads = []
+        for session_id, (key, webhook_data, new_status) in sessions.items():
+            transaction = by_wave_id.get(session_id)
+            if not transaction:
+                results[key] = {'success': False, 'error': 'Transaction not found'}
+                continue
+            if session_id in rejected:
+                _logger.warning(f"Transition {transaction.status} -> {new_status} refusée pour la transaction {transaction.id}")
+            session = webhook_data['data']
+            # Statuts Wave bruts écrits seulement si la transition est acceptée
+            raw_vals = {} if session_id in rejected else transaction._raw_status_vals(session)
+            checkout_status = raw_vals.get('checkout_status', transaction.checkout_status)
+            payment_status = raw_vals.get('payment_status', transaction.payment_status)
+            target_status = accepted.get(session_id, transaction.status)
+            groups.setdefault((target_status, checkout_status, payment_status), []).append(transaction.id)
+            payloads.append((
+                transaction.id,
+                json.dumps(webhook_data),
+                self._convert_iso_date(session.get('when_completed')),
+            ))
+            results[key] = {'success': True}
+            if session_id in rejected:
+                results[key]['ignored'] = f"transition {transaction.status} -> {new_status} not allowed"
+        if not payloads:
+            return results
+
+        Transaction = self.env['wave.transaction'].sudo()
+        completing = Transaction.browse()
+        for (new_status, checkout_status, payment_status), ids in groups.items():
+            group = Transaction.browse(ids)
+            if new_status == 'completed':
+                completing |= group.filtered(lambda t: t.status != 'completed')
+            group.write({
+                'status': new_status,
+                'checkout_status': checkout_status,
+                'payment_status': payment_status,
+            })
+
+        # Données propres à chaque transaction : une seule instruction pour tout le lot
+        execute_values(self.env.cr, """
+            UPDATE wave_transaction t
+               SET completed_at = COALESCE(v.completed_at::timestamp, t.completed_at)
+              FROM (VALUES %s) AS v(id, completed_at)
+             WHERE t.id = v.id
+        """, [(transaction_id, completed_at) for transaction_id, content, completed_at in payloads])
+        self.env['wave.transaction.payload'].sudo()._append(
+            [(transaction_id, 'webhook', content) for transaction_id, content, completed_at in payloads]
+        )
+        Transaction.browse([payload[0] for payload in payloads]).invalidate_recordset(
+            ['completed_at', 'webhook_data', 'payload_ids']
+        )
+
+        # Le statut complété est conservé : un paiement non créé est confié à la file
+        # des tâches, qui le rejoue avec délai sans laisser la transaction en attente
+        failed_payments = self.env['wave.transaction'].sudo()
+        for transaction in completing:
+            try:
+                with self.env.cr.savepoint():
+                    result = transaction._create_payment_transaction()
+                    if result is False:
+                        # La méthode journalise l'erreur et retourne False : annuler ses écritures
+                        raise WaveWebhookError("_create_payment_transaction a échoué, voir les journaux du serveur")
+            except Exception as e:
+                _logger.error(f"Error creating payment for transaction {transaction.transaction_id}: {str(e)}")
+                failed_payments |= transaction
+                continue
+            _logger.info(f"Payment transaction created: {result}")
+        if failed_payments:
+            self.env['wave.transaction.job'].sudo()._enqueue(failed_payments, ['order_payment'])
+
+        return results
+
+    @api.model
+    def _convert_iso_date(self, iso_date):
+        try:
+            return datetime.strptime(iso_date, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            return None
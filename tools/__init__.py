@@ -0,0 +1,7 @@
+
+from . import circuit_breaker
+from . import rate_limiter
+from . import wave_client
+from . import session_cache
+from . import single_flight
+from . import wave_status
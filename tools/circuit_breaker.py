@@ -0,0 +1,125 @@
+
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Levée quand le disjoncteur refuse un appel vers l'API Wave"""
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(
+            f"API Wave indisponible (disjoncteur ouvert), nouvel essai possible dans {max(retry_in, 1):.0f} s"
+        )
+
+
+class CircuitBreaker:
+    """Disjoncteur à fenêtre glissante avec délai de lecture adaptatif.
+
+    Chaque appel est enregistré avec sa durée ; une erreur réseau, une réponse
+    5xx ou un appel plus lent que ``slow_call`` compte comme un échec. Quand le
+    taux d'échec dépasse ``error_threshold`` sur la fenêtre, le circuit s'ouvre
+    et les appels échouent immédiatement pendant ``open_duration`` secondes,
+    puis un appel de sonde est autorisé (demi-ouvert) : son succès referme le
+    circuit, son échec le rouvre.
+
+    Le délai de lecture recommandé est dérivé du p99 des appels réussis de la
+    fenêtre, borné entre ``min_timeout`` et le délai configuré.
+    """
+
+    def __init__(self, error_threshold=0.5, min_calls=10, open_duration=30.0, slow_call=5.0,
+                 window=60.0, adaptive_timeout=True, min_timeout=2.0, timeout_factor=3.0):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.slow_call = slow_call
+        self.window = window
+        self.adaptive_timeout = adaptive_timeout
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+            self._probe_in_flight = False
+            self._calls = deque()
+
+    def _prune(self, now):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def before_call(self):
+        """Vérifier qu'un appel est autorisé, sinon lever CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self.opened_at + self.open_duration - time.monotonic()
+                if retry_in > 0:
+                    raise CircuitOpenError(retry_in)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(self.open_duration)
+                self._probe_in_flight = True
+
+    def record(self, latency, ok):
+        """Enregistrer le résultat d'un appel autorisé par before_call()"""
+        now = time.monotonic()
+        ok = ok and latency <= self.slow_call
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self.state = OPEN
+                    self.opened_at = now
+                    return
+            self._calls.append((now, latency, ok))
+            self._prune(now)
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for call in self._calls if not call[2])
+                if failures / len(self._calls) >= self.error_threshold:
+                    self.state = OPEN
+                    self.opened_at = now
+
+    def _p99(self):
+        latencies = sorted(call[1] for call in self._calls if call[2])
+        if len(latencies) < self.min_calls:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def read_timeout(self, default):
+        """Délai de lecture à appliquer au prochain appel"""
+        if not self.adaptive_timeout:
+            return default
+        with self._lock:
+            self._prune(time.monotonic())
+            p99 = self._p99()
+        if p99 is None:
+            return default
+        return min(default, max(self.min_timeout, p99 * self.timeout_factor))
+
+    def snapshot(self, default_timeout):
+        """État courant du disjoncteur, pour affichage"""
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for call in self._calls if not call[2])
+            p99 = self._p99()
+            state = self.state
+        return {
+            'state': state,
+            'calls': calls,
+            'error_rate': failures / calls if calls else 0.0,
+            'p99': p99 or 0.0,
+            'read_timeout': self.read_timeout(default_timeout),
+        }
@@ -0,0 +1,104 @@
+
+import logging
+import time
+
+from psycopg2.extensions import ISOLATION_LEVEL_READ_COMMITTED
+
+from odoo.sql_db import db_connect
+
+_logger = logging.getLogger(__name__)
+
+# Priorités des appels Wave, de la plus haute à la plus basse
+PRIORITY_INITIATE = 0
+PRIORITY_STATUS = 1
+PRIORITY_BULK = 2
+
+# Part du seau réservée aux priorités supérieures : un appel de priorité
+# donnée ne consomme un jeton que s'il en reste au moins cette fraction
+# après lui, et attente maximale relative (multiple de max_wait).
+_PRIORITY_RESERVE = {PRIORITY_INITIATE: 0.0, PRIORITY_STATUS: 0.25, PRIORITY_BULK: 0.5}
+_PRIORITY_WAIT = {PRIORITY_INITIATE: 1.0, PRIORITY_STATUS: 1.0, PRIORITY_BULK: 5.0}
+
+_NOW = "(clock_timestamp() AT TIME ZONE 'UTC')"
+_AVAILABLE = f"LEAST(%(burst)s, tokens + %(rate)s * EXTRACT(EPOCH FROM ({_NOW} - updated_at)))"
+
+
+class RateLimitExceeded(Exception):
+    """Levée quand aucun jeton n'a pu être obtenu dans le délai d'attente"""
+
+
+class PostgresRateLimiter:
+    """Seau à jetons partagé par tous les workers via une ligne PostgreSQL.
+
+    Chaque tentative est une instruction UPDATE atomique exécutée dans une
+    transaction courte et indépendante de celle de la requête HTTP : le verrou
+    de ligne n'est tenu que le temps de l'instruction. Les appels de priorité
+    basse laissent une réserve de jetons aux priorités supérieures et, faute
+    de jeton, attendent brièvement au lieu d'échouer.
+    """
+
+    def __init__(self, dbname, config_id, rate=20.0, burst=40, max_wait=2.0):
+        self.dbname = dbname
+        self.config_id = config_id
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._bucket_ready = False
+
+    def _execute(self, query, params):
+        with db_connect(self.dbname).cursor() as cr:
+            # En READ COMMITTED, un UPDATE concurrent sur le seau est réévalué au lieu
+            # de lever une erreur de sérialisation
+            cr._cnx.set_isolation_level(ISOLATION_LEVEL_READ_COMMITTED)
+            cr.execute(query, params)
+            return cr.fetchone() if cr.description else None
+
+    def _ensure_bucket(self):
+        """Créer la ligne du seau (plein) si elle n'existe pas encore"""
+        if not self._bucket_ready:
+            self._execute(f"""
+                INSERT INTO wave_rate_bucket (config_id, tokens, updated_at)
+                VALUES (%(id)s, %(burst)s, {_NOW})
+                ON CONFLICT (config_id) DO NOTHING
+            """, {'id': self.config_id, 'burst': self.burst})
+            self._bucket_ready = True
+
+    def _try_acquire(self, reserve):
+        """Prendre un jeton ; retourner 0 en cas de succès, sinon l'attente estimée en secondes"""
+        params = {'id': self.config_id, 'rate': self.rate, 'burst': self.burst, 'needed': 1 + reserve}
+        row = self._execute(f"""
+            UPDATE wave_rate_bucket
+               SET tokens = {_AVAILABLE} - 1,
+                   updated_at = {_NOW}
+             WHERE config_id = %(id)s AND {_AVAILABLE} >= %(needed)s
+         RETURNING tokens
+        """, params)
+        if row:
+            return 0
+        row = self._execute(f"SELECT {_AVAILABLE} FROM wave_rate_bucket WHERE config_id = %(id)s", params)
+        available = row[0] if row else 0
+        return max((params['needed'] - available) / self.rate, 0.01)
+
+    def acquire(self, priority=PRIORITY_STATUS):
+        """Attendre un jeton pour un appel de la priorité donnée"""
+        reserve = self.burst * _PRIORITY_RESERVE.get(priority, 0.0)
+        deadline = time.monotonic() + self.max_wait * _PRIORITY_WAIT.get(priority, 1.0)
+        self._ensure_bucket()
+        while True:
+            wait = self._try_acquire(reserve)
+            if not wait:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RateLimitExceeded(
+                    "Limite d'appels à l'API Wave atteinte, veuillez réessayer dans quelques instants"
+                )
+            time.sleep(min(wait, remaining))
+
+    def penalize(self, retry_after=None):
+        """Vider le seau pour tous les workers après une réponse 429 de Wave"""
+        debt = self.rate * retry_after if retry_after else 0
+        self._execute(f"""
+            UPDATE wave_rate_bucket SET tokens = %(tokens)s, updated_at = {_NOW} WHERE config_id = %(id)s
+        """, {'id': self.config_id, 'tokens': -debt})
+        _logger.warning(f"Réponse 429 de l'API Wave : seau de jetons de la configuration {self.config_id} vidé (Retry-After: {retry_after})")
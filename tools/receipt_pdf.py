@@ -0,0 +1,380 @@
+"""Génération directe du reçu de paiement Wave au format PDF.
+
+Le reçu est une page A4 à mise en page fixe (en-tête, bloc société,
+informations de facture, tableau clé/valeur, total, pied de page). Ce
+module l'écrit directement en PDF, sans moteur HTML : polices standard
+Helvetica (encodage WinAnsi), logo JPEG ou PNG intégré tel quel ou après
+décodage du canal alpha. Aucune dépendance Odoo, pour être utilisable par
+benchmarks/bench_receipt_pdf.py.
+
+Le reçu est décrit par un dictionnaire :
+
+    {
+        'title': 'FACTURE DE PAIEMENT',
+        'reference': 'REF-1',
+        'logo': b'...',                       # JPEG/PNG, facultatif
+        'company_name': 'CCBM SHOP',
+        'company': [('Adresse', 'Dakar'), ...],
+        'invoice': [('Numéro de facture', 'WAVE-000001'), ...],
+        'status': 'PAYÉ',
+        'rows': [('Transaction ID', 'TX-1'), ...],
+        'total': '10,000 FCFA',
+        'footer': ['Contacts: ...', ...],
+    }
+"""
+import functools
+import struct
+import unicodedata
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4 en points
+MARGIN = 40
+
+BLUE = (0.157, 0.475, 0.725)        # #2879b9
+GREEN = (0.157, 0.655, 0.271)       # #28a745
+GREY = (0.424, 0.459, 0.490)        # #6c757d
+LIGHT = (0.973, 0.976, 0.980)       # #f8f9fa
+BORDER = (0.871, 0.886, 0.902)      # #dee2e6
+BLACK = (0, 0, 0)
+WHITE = (1, 1, 1)
+
+# Chasses des caractères 32 à 126 (métriques AFM d'Adobe, unités de 1/1000 pt)
+_WIDTHS = {
+    'F1': [  # Helvetica
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ],
+    'F2': [  # Helvetica-Bold
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ],
+}
+FONTS = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold'}
+
+
+class ReceiptPdfError(Exception):
+    """Image ou données du reçu non prises en charge"""
+
+
+def _char_width(char, font):
+    code = ord(char)
+    if not 32 <= code <= 126:
+        # Caractère accentué : chasse de la lettre de base
+        base = unicodedata.normalize('NFKD', char)[:1]
+        code = ord(base) if base else 0
+        if not 32 <= code <= 126:
+            return 556
+    return _WIDTHS[font][code - 32]
+
+
+def text_width(text, font, size):
+    """Largeur en points d'une chaîne dans la police standard ``font``"""
+    return sum(_char_width(char, font) for char in text) * size / 1000
+
+
+def wrap(text, font, size, width):
+    """Découper ``text`` en lignes d'au plus ``width`` points"""
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if line and text_width(candidate, font, size) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    raw = str(text).encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _color(rgb):
+    return ' '.join(f"{component:.3f}" for component in rgb).encode()
+
+
+class _Canvas:
+    """Flux de contenu d'une page ; ordonnées comptées depuis le haut de la page"""
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, top, text, font='F1', size=10, color=BLACK):
+        y = PAGE_HEIGHT - top - size
+        self.ops.append(b"BT %s rg /%s %s Tf %.2f %.2f Td (%s) Tj ET" % (
+            _color(color), font.encode(), str(size).encode(), x, y, _escape(text)))
+
+    def labelled(self, x, top, label, value, size=10, color=BLACK):
+        """« Libellé: valeur », libellé en gras"""
+        label = f"{label}: "
+        self.text(x, top, label, 'F2', size, color)
+        self.text(x + text_width(label, 'F2', size), top, value, 'F1', size, color)
+
+    def rect(self, x, top, width, height, fill=None, stroke=None, line_width=0.75):
+        y = PAGE_HEIGHT - top - height
+        ops = b"%.2f %.2f %.2f %.2f re" % (x, y, width, height)
+        if fill and stroke:
+            self.ops.append(b"%s rg %s RG %.2f w %s B" % (_color(fill), _color(stroke), line_width, ops))
+        elif fill:
+            self.ops.append(b"%s rg %s f" % (_color(fill), ops))
+        else:
+            self.ops.append(b"%s RG %.2f w %s S" % (_color(stroke), line_width, ops))
+
+    def image(self, name, x, top, width, height):
+        y = PAGE_HEIGHT - top - height
+        self.ops.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /%s Do Q" % (width, height, x, y, name.encode()))
+
+    def stream(self):
+        return b"\n".join(self.ops)
+
+
+# --- Images -----------------------------------------------------------------
+
+def _jpeg_image(data):
+    """Dimensions d'un JPEG, intégré tel quel (DCTDecode)"""
+    index = 2
+    while index < len(data):
+        if data[index] != 0xFF:
+            raise ReceiptPdfError("JPEG invalide")
+        marker = data[index + 1]
+        length = struct.unpack('>H', data[index + 2:index + 4])[0]
+        if marker in (0xC0, 0xC1, 0xC2):
+            height, width = struct.unpack('>HH', data[index + 5:index + 9])
+            components = data[index + 9]
+            colorspace = {1: b'/DeviceGray', 3: b'/DeviceRGB', 4: b'/DeviceCMYK'}[components]
+            header = b"/Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter /DCTDecode" % (
+                width, height, colorspace)
+            return {'width': width, 'height': height, 'header': header, 'data': data, 'smask': None}
+        index += 2 + length
+    raise ReceiptPdfError("JPEG sans en-tête de trame")
+
+
+def _png_unfilter(raw, width, bpp, height):
+    """Annuler les filtres de ligne PNG ; retourner les octets des pixels"""
+    stride = width * bpp
+    previous = bytearray(stride)
+    out = bytearray()
+    position = 0
+    for _row in range(height):
+        kind = raw[position]
+        line = bytearray(raw[position + 1:position + 1 + stride])
+        position += 1 + stride
+        for i in range(stride):
+            left = line[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            if kind == 1:
+                line[i] = (line[i] + left) & 0xFF
+            elif kind == 2:
+                line[i] = (line[i] + up) & 0xFF
+            elif kind == 3:
+                line[i] = (line[i] + ((left + up) >> 1)) & 0xFF
+            elif kind == 4:
+                up_left = previous[i - bpp] if i >= bpp else 0
+                estimate = left + up - up_left
+                pa, pb, pc = abs(estimate - left), abs(estimate - up), abs(estimate - up_left)
+                predictor = left if pa <= pb and pa <= pc else (up if pb <= pc else up_left)
+                line[i] = (line[i] + predictor) & 0xFF
+        out += line
+        previous = line
+    return bytes(out)
+
+
+def _png_image(data):
+    """PNG 8 bits non entrelacé ; le canal alpha devient un masque doux (SMask)"""
+    position = 8
+    chunks = {}
+    idat = bytearray()
+    while position < len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if kind == b'IDAT':
+            idat += body
+        else:
+            chunks.setdefault(kind, body)
+        position += 12 + length
+    width, height, depth, color_type, _compression, _filter, interlace = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+    if depth != 8 or interlace:
+        raise ReceiptPdfError("PNG non pris en charge (profondeur 8 bits non entrelacée requise)")
+
+    colors = {0: 1, 2: 3, 3: 1, 4: 1, 6: 3}[color_type]
+    if color_type in (0, 2, 3):
+        # Données PNG réutilisées sans décodage grâce au prédicteur PNG de FlateDecode
+        if color_type == 3:
+            palette = chunks[b'PLTE']
+            colorspace = b"[/Indexed /DeviceRGB %d <%s>]" % (len(palette) // 3 - 1, palette.hex().encode())
+        else:
+            colorspace = b'/DeviceRGB' if colors == 3 else b'/DeviceGray'
+        header = (b"/Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter /FlateDecode "
+                  b"/DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent 8 /Columns %d >>") % (
+            width, height, colorspace, colors, width)
+        return {'width': width, 'height': height, 'header': header, 'data': bytes(idat), 'smask': None}
+
+    # Gris ou RVB avec alpha : séparer couleur et transparence
+    pixels = _png_unfilter(zlib.decompress(bytes(idat)), width, colors + 1, height)
+    step = colors + 1
+    color = bytes(b for i, b in enumerate(pixels) if i % step != colors)
+    alpha = pixels[colors::step]
+    colorspace = b'/DeviceRGB' if colors == 3 else b'/DeviceGray'
+    header = b"/Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter /FlateDecode" % (
+        width, height, colorspace)
+    smask = b"/Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode" % (
+        width, height)
+    return {
+        'width': width, 'height': height, 'header': header, 'data': zlib.compress(color),
+        'smask': (smask, zlib.compress(alpha)),
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def load_image(data):
+    """Préparer une image JPEG ou PNG pour l'intégration ; mis en cache par contenu"""
+    if data.startswith(b'\xff\xd8'):
+        return _jpeg_image(data)
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return _png_image(data)
+    raise ReceiptPdfError("Format d'image non pris en charge (JPEG ou PNG attendu)")
+
+
+# --- Mise en page -----------------------------------------------------------
+
+def _layout(receipt, logo):
+    canvas = _Canvas()
+    left, right = MARGIN, PAGE_WIDTH - MARGIN
+    content_width = right - left
+    top = MARGIN
+
+    # En-tête : titre et référence à gauche, logo à droite
+    header_height = 44
+    if logo:
+        scale = min(180 / logo['width'], 90 / logo['height'], 1)
+        logo_width, logo_height = logo['width'] * scale, logo['height'] * scale
+        canvas.image('Im1', right - logo_width, top, logo_width, logo_height)
+        header_height = max(header_height, logo_height)
+    canvas.text(left, top, receipt.get('title', 'FACTURE DE PAIEMENT'), 'F2', 18, BLUE)
+    canvas.labelled(left, top + 26, 'Référence', receipt.get('reference') or '', 13)
+    top += header_height + 12
+    canvas.rect(left, top, content_width, 2, fill=BLUE)
+    top += 24
+
+    # Bloc société
+    canvas.text(left, top, receipt.get('company_name', ''), 'F2', 13, BLUE)
+    top += 20
+    for label, value in receipt.get('company', ()):
+        canvas.labelled(left, top, label, value)
+        top += 15
+    top += 14
+
+    # Informations de facture sur fond gris
+    invoice = list(receipt.get('invoice', ()))
+    box_height = 40 + 15 * (len(invoice) + 1)
+    canvas.rect(left, top, content_width, box_height, fill=LIGHT)
+    canvas.text(left + 12, top + 12, 'Informations de la facture', 'F2', 12)
+    line = top + 32
+    for label, value in invoice:
+        canvas.labelled(left + 12, line, label, value)
+        line += 15
+    canvas.text(left + 12, line, 'Statut: ', 'F2', 10)
+    canvas.text(left + 12 + text_width('Statut: ', 'F2', 10), line, receipt.get('status', ''), 'F2', 10, GREEN)
+    top += box_height + 18
+
+    # Détails de la transaction : tableau clé/valeur
+    canvas.text(left, top, 'Détails de la transaction', 'F2', 12)
+    top += 22
+    label_width = content_width * 0.35
+    value_width = content_width - label_width
+    for label, value in receipt.get('rows', ()):
+        lines = wrap(value, 'F1', 10, value_width - 16)
+        row_height = 12 + 13 * len(lines)
+        canvas.rect(left, top, label_width, row_height, fill=BLUE, stroke=BORDER)
+        canvas.rect(left + label_width, top, value_width, row_height, stroke=BORDER)
+        canvas.text(left + 8, top + 7, label, 'F2', 10, WHITE)
+        for index, text in enumerate(lines):
+            canvas.text(left + label_width + 8, top + 7 + 13 * index, text)
+        top += row_height
+    top += 24
+
+    # Total aligné à droite
+    total = receipt.get('total', '')
+    label = 'MONTANT TOTAL PAYÉ: '
+    x = right - text_width(label + total, 'F2', 14)
+    canvas.text(x, top, label, 'F2', 14)
+    canvas.text(x + text_width(label, 'F2', 14), top, total, 'F2', 14, BLUE)
+    top += 48
+
+    # Pied de page centré
+    footer = list(receipt.get('footer', ()))
+    if receipt.get('company_name'):
+        footer.insert(0, receipt['company_name'])
+    for index, text in enumerate(footer):
+        font, color = ('F2', BLUE) if index == 0 and receipt.get('company_name') else ('F1', GREY)
+        canvas.text((PAGE_WIDTH - text_width(text, font, 9)) / 2, top, text, font, 9, color)
+        top += 13
+    return canvas.stream()
+
+
+def render_receipt(receipt):
+    """Retourner le PDF (bytes) d'un reçu décrit par ``receipt``"""
+    logo = None
+    if receipt.get('logo'):
+        try:
+            logo = load_image(bytes(receipt['logo']))
+        except (ReceiptPdfError, KeyError, ValueError, struct.error, zlib.error):
+            logo = None  # Le reçu reste valable sans logo
+    content = zlib.compress(_layout(receipt, logo))
+
+    objects = []
+
+    def add(body, stream=None):
+        objects.append((body, stream))
+        return len(objects)
+
+    catalog = add(None)
+    pages = add(None)
+    fonts = {name: add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base.encode())
+             for name, base in FONTS.items()}
+    resources = b"/Font << %s >>" % b" ".join(b"/%s %d 0 R" % (name.encode(), ref) for name, ref in fonts.items())
+    if logo:
+        header = logo['header']
+        if logo['smask']:
+            smask_header, smask_data = logo['smask']
+            smask = add(b"<< /Type /XObject /Subtype /Image " + smask_header + b" >>", smask_data)
+            header += b" /SMask %d 0 R" % smask
+        image = add(b"<< /Type /XObject /Subtype /Image " + header + b" >>", logo['data'])
+        resources += b" /XObject << /Im1 %d 0 R >>" % image
+    contents = add(b"<< /Filter /FlateDecode >>", content)
+    page = add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources << %s >> /Contents %d 0 R >>" % (
+        pages, PAGE_WIDTH, PAGE_HEIGHT, resources, contents))
+    info = add(b"<< /Title (%s) /Producer (wave receipt_pdf) >>" % _escape(
+        f"Facture Wave - {receipt.get('reference') or ''}"))
+    objects[catalog - 1] = (b"<< /Type /Catalog /Pages %d 0 R >>" % pages, None)
+    objects[pages - 1] = (b"<< /Type /Pages /Kids [%d 0 R] /Count 1 >>" % page, None)
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, (body, stream) in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number
+        if stream is None:
+            out += body
+        else:
+            # Ajouter la longueur au dictionnaire du flux
+            out += body[:-2] + b"/Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        out += b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%EOF\n" % (
+        len(objects) + 1, catalog, info, xref)
+    return bytes(out)
@@ -0,0 +1,68 @@
+
+import threading
+import time
+from collections import OrderedDict
+
+# Statuts de checkout Wave qui n'évoluent plus : mis en cache sans expiration
+TERMINAL_CHECKOUT_STATUSES = ('complete', 'expired')
+
+
+class SessionCache:
+    """Cache LRU borné à durée de vie (TTL) pour l'état des sessions Wave.
+
+    Chaque entrée peut porter un ``stamp`` (par exemple la date de dernière
+    mise à jour de la transaction) : une lecture avec un stamp différent est
+    un défaut de cache. Cela invalide l'entrée dans tous les workers dès que
+    la transaction est réécrite, sans signalisation entre processus.
+    """
+
+    def __init__(self, maxsize=2048, ttl=15.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, entry_stamp = entry
+            if (expires_at is not None and expires_at < time.monotonic()) or \
+                    (stamp is not None and stamp != entry_stamp):
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, stamp=None):
+        terminal = (value.get('checkout_status') or '').lower() in TERMINAL_CHECKOUT_STATUSES
+        expires_at = None if terminal else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at, stamp)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_session_cache(key, maxsize, ttl):
+    """Retourner le cache de sessions du worker courant pour la clé ``key``"""
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = SessionCache(maxsize=maxsize, ttl=ttl)
+        else:
+            cache.maxsize, cache.ttl = maxsize, ttl
+        return cache
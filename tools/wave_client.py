@@ -0,0 +1,120 @@
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .circuit_breaker import CircuitBreaker
+from .rate_limiter import PRIORITY_STATUS, PostgresRateLimiter
+
+_logger = logging.getLogger(__name__)
+
+WAVE_API_URL = 'https://api.wave.com/v1'
+
+
+class WaveClient:
+    """Client HTTP Wave avec pool de connexions persistantes (keep-alive).
+
+    Une instance est partagée par tous les appels d'un même worker pour une
+    configuration donnée : la poignée de main TCP+TLS vers api.wave.com n'est
+    payée qu'une fois par connexion du pool au lieu d'une fois par appel.
+    """
+
+    def __init__(self, api_key, base_url=WAVE_API_URL, connect_timeout=5.0, read_timeout=30.0,
+                 max_retries=2, backoff_factor=0.3, pool_size=10, breaker=None, rate_limit=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(**(breaker or {}))
+        self.rate_limiter = PostgresRateLimiter(**rate_limit) if rate_limit else None
+
+        # Les erreurs de connexion sont rejouées pour toutes les méthodes (la requête
+        # n'est jamais partie) ; les erreurs de lecture et les 5xx seulement pour GET,
+        # afin de ne jamais créer deux sessions de paiement pour un même POST.
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def request(self, method, path, timeout=None, priority=PRIORITY_STATUS, **kwargs):
+        """Envoyer une requête à l'API Wave via le pool de connexions.
+
+        L'appel attend d'abord un jeton du limiteur partagé selon sa priorité
+        (RateLimitExceeded si l'attente dépasse le délai), puis lève
+        CircuitOpenError sans appel réseau si le disjoncteur est ouvert.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        if self.rate_limiter:
+            self.rate_limiter.acquire(priority)
+        self.breaker.before_call()
+        if timeout is None:
+            timeout = (self.timeout[0], self.breaker.read_timeout(self.timeout[1]))
+        start = time.monotonic()
+        ok = False
+        try:
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+            ok = response.status_code < 500
+            if response.status_code == 429 and self.rate_limiter:
+                self.rate_limiter.penalize(_retry_after(response))
+            return response
+        finally:
+            self.breaker.record(time.monotonic() - start, ok)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(key, **settings):
+    """Retourner le client Wave du worker courant pour la clé ``key``.
+
+    Le client est recréé si les paramètres ont changé ou si le processus a été
+    forké depuis sa création (les sockets ne doivent pas être partagées entre
+    workers).
+    """
+    pid = os.getpid()
+    signature = repr(sorted(settings.items()))
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry and entry[0] == pid and entry[1] == signature:
+            return entry[2]
+        if entry and entry[0] == pid:
+            entry[2].close()
+        client = WaveClient(**settings)
+        _clients[key] = (pid, signature, client)
+        _logger.info(f"Nouveau client Wave pour {key} (pid {pid})")
+        return client
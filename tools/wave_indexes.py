@@ -0,0 +1,13 @@
+"""Index composites et partiels de la table wave_transaction.
+
+Définitions pures (sans dépendance Odoo) partagées par le modèle, qui les
+crée dans init(), et par benchmarks/bench_queries.py.
+"""
+
+# (nom, expressions, condition WHERE) ; chaque index correspond à une requête du module
+TRANSACTION_INDEXES = [
+    # Historique d'un client : partner_id = ? ORDER BY created_at DESC
+    ('wave_transaction_partner_created_at_idx', ['partner_id', 'created_at DESC'], ''),
+    # Cron d'expiration : status = 'pending' AND created_at < ?
+    ('wave_transaction_pending_created_at_idx', ['created_at'], "status = 'pending'"),
+]
@@ -0,0 +1,324 @@
+
+"""Simulateur local de l'API Wave Checkout.
+
+Reproduit les points d'entrée des sessions de paiement utilisés par le
+module (création, lecture, recherche par ID de transaction, remboursement,
+expiration) et envoie des webhooks signés comme Wave, avec latence, erreurs
+5xx et réponses 429 configurables. Aucune dépendance hors bibliothèque
+standard ; à lancer hors d'Odoo :
+
+    python tools/wave_simulator.py --port 8765 --webhook-url http://localhost:8069/wave/webhook \\
+        --webhook-secret <secret> --latency-ms 80 --error-rate 0.01 --rate-limit 50
+
+puis choisir l'environnement « Simulateur local » sur la configuration Wave.
+Le lien de paiement (wave_launch_url) d'une session simule le client :
+l'ouvrir complète la session (ou la fait échouer selon --payment-failure-rate).
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_logger = logging.getLogger('wave_simulator')
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Retourner 0 si un jeton est pris, sinon l'attente conseillée en secondes"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class WaveSimulator:
+    """État des sessions simulées et émission des webhooks"""
+
+    def __init__(self, options):
+        self.options = options
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.bucket = TokenBucket(options.rate_limit) if options.rate_limit else None
+
+    # Sessions
+
+    def create_session(self, payload, base_url):
+        session_id = f"cos-{uuid.uuid4().hex[:20]}"
+        now = _now()
+        session = {
+            'id': session_id,
+            'amount': str(payload.get('amount')),
+            'currency': payload.get('currency', 'XOF'),
+            'business_name': 'Simulateur Wave',
+            'checkout_status': 'open',
+            'payment_status': 'processing',
+            'client_reference': payload.get('client_reference'),
+            'success_url': payload.get('success_url'),
+            'error_url': payload.get('error_url'),
+            'transaction_id': f"T_{uuid.uuid4().hex[:16].upper()}",
+            'wave_launch_url': f"{base_url}/pay/{session_id}",
+            'when_created': _iso(now),
+            'when_expires': _iso(now + timedelta(minutes=30)),
+            'when_completed': None,
+            'when_refunded': None,
+            'last_payment_error': None,
+        }
+        with self.lock:
+            self.sessions[session_id] = session
+        if self.options.auto_complete is not None:
+            threading.Timer(self.options.auto_complete, self.pay, args=(session_id,)).start()
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return dict(session) if session else None
+
+    def find_by_transaction(self, transaction_id):
+        with self.lock:
+            for session in self.sessions.values():
+                if session['transaction_id'] == transaction_id:
+                    return dict(session)
+        return None
+
+    def _update(self, session_id, allowed_checkout, **values):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if not session or session['checkout_status'] not in allowed_checkout:
+                return None
+            session.update(values)
+            return dict(session)
+
+    def pay(self, session_id):
+        """Simuler le paiement du client sur le lien Wave"""
+        if random.random() < self.options.payment_failure_rate:
+            session = self._update(session_id, ('open',), payment_status='cancelled', last_payment_error={
+                'code': 'insufficient-funds', 'message': 'Solde insuffisant',
+            })
+            event_type = 'checkout.session.payment_failed'
+        else:
+            session = self._update(session_id, ('open',), checkout_status='complete',
+                                   payment_status='succeeded', when_completed=_iso(_now()))
+            event_type = 'checkout.session.completed'
+        if session:
+            self.send_webhook(event_type, session)
+        return session
+
+    def refund(self, session_id):
+        session = self._update(session_id, ('complete',), payment_status='refunded', when_refunded=_iso(_now()))
+        if session:
+            self.send_webhook('checkout.session.refunded', session)
+        return session
+
+    def expire(self, session_id):
+        session = self._update(session_id, ('open',), checkout_status='expired')
+        if session:
+            self.send_webhook('checkout.session.expired', session)
+        return session
+
+    # Webhooks
+
+    def send_webhook(self, event_type, session):
+        if not self.options.webhook_url:
+            return
+        event = {'id': f"EV_{uuid.uuid4().hex[:20]}", 'type': event_type, 'data': session}
+        threading.Timer(self.options.webhook_delay_ms / 1000.0, self._post_webhook, args=(event,)).start()
+
+    def _post_webhook(self, event):
+        body = json.dumps(event)
+        timestamp = str(int(time.time()))
+        signature = hmac.new(
+            self.options.webhook_secret.encode('utf-8'),
+            f"{timestamp}.{body}".encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        http_request = urllib.request.Request(
+            self.options.webhook_url,
+            data=body.encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Wave-Signature': f"t={timestamp},v1={signature}"},
+            method='POST',
+        )
+        deliveries = 2 if random.random() < self.options.duplicate_webhook_rate else 1
+        for _i in range(deliveries):
+            try:
+                with urllib.request.urlopen(http_request, timeout=10) as response:
+                    _logger.info("Webhook %s %s -> %s", event['type'], event['data']['id'], response.status)
+            except Exception as e:
+                _logger.warning("Webhook %s %s en échec : %s", event['type'], event['data']['id'], e)
+
+
+class WaveRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'WaveSimulator/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def simulator(self):
+        return self.server.simulator
+
+    def log_message(self, format, *args):
+        _logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, payload=None, headers=None):
+        body = json.dumps(payload if payload is not None else {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            return None
+
+    def _inject_faults(self):
+        """Appliquer latence, limitation de débit et erreurs ; retourner True si la réponse est déjà envoyée"""
+        options = self.simulator.options
+        latency = max(random.gauss(options.latency_ms, options.jitter_ms), 0) / 1000.0
+        time.sleep(latency)
+        if self.simulator.bucket:
+            wait = self.simulator.bucket.take()
+            if wait:
+                self._send(429, {'code': 'rate-limit-exceeded', 'message': 'Too many requests'},
+                           {'Retry-After': f"{max(wait, 1):.0f}"})
+                return True
+        if random.random() < options.rate_429:
+            self._send(429, {'code': 'rate-limit-exceeded', 'message': 'Too many requests'}, {'Retry-After': '1'})
+            return True
+        if random.random() < options.error_rate:
+            self._send(random.choice((500, 502, 503)), {'code': 'internal-server-error', 'message': 'Simulated failure'})
+            return True
+        return False
+
+    def _authorized(self):
+        authorization = self.headers.get('Authorization', '')
+        api_key = self.simulator.options.api_key
+        if not authorization.startswith('Bearer ') or (api_key and authorization[7:] != api_key):
+            self._send(401, {'code': 'no-auth', 'message': 'Invalid API key'})
+            return False
+        return True
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+
+        # Lien de paiement : simule l'action du client
+        if len(parts) == 2 and parts[0] == 'pay':
+            session = self.simulator.pay(parts[1])
+            if not session:
+                return self._send(404, {'code': 'not-found', 'message': 'Unknown or closed session'})
+            target = session['success_url'] if session['checkout_status'] == 'complete' else session['error_url']
+            self.send_response(302)
+            self.send_header('Location', target or '/')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if not self._authorized() or self._inject_faults():
+            return
+        if parts == ['v1', 'checkout', 'sessions']:
+            transaction_id = parse_qs(url.query).get('transaction_id', [None])[0]
+            session = self.simulator.find_by_transaction(transaction_id)
+            return self._send(200, session) if session else self._send(404, {'code': 'not-found'})
+        if len(parts) == 4 and parts[:3] == ['v1', 'checkout', 'sessions']:
+            session = self.simulator.get(parts[3])
+            return self._send(200, session) if session else self._send(404, {'code': 'not-found'})
+        self._send(404, {'code': 'not-found'})
+
+    def do_POST(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        payload = self._read_json()
+        if not self._authorized() or self._inject_faults():
+            return
+        if payload is None:
+            return self._send(400, {'code': 'request-validation-error', 'message': 'Invalid JSON'})
+
+        if parts == ['v1', 'checkout', 'sessions']:
+            if not payload.get('amount') or not payload.get('success_url') or not payload.get('error_url'):
+                return self._send(400, {'code': 'request-validation-error', 'message': 'Missing required field'})
+            return self._send(200, self.simulator.create_session(payload, self._base_url()))
+        if len(parts) == 5 and parts[:3] == ['v1', 'checkout', 'sessions'] and parts[4] in ('refund', 'expire'):
+            session_id = parts[3]
+            if not self.simulator.get(session_id):
+                return self._send(404, {'code': 'not-found'})
+            session = getattr(self.simulator, parts[4])(session_id)
+            if not session:
+                return self._send(409, {'code': 'checkout-session-not-' + ('completed' if parts[4] == 'refund' else 'open')})
+            return self._send(200, {} if parts[4] == 'refund' else session)
+        self._send(404, {'code': 'not-found'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulateur local de l'API Wave Checkout")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--api-key', default='', help="Clé API exigée (toute clé Bearer acceptée si vide)")
+    parser.add_argument('--webhook-url', default='', help="URL /wave/webhook d'Odoo à notifier")
+    parser.add_argument('--webhook-secret', default='simulator', help="Secret de signature des webhooks")
+    parser.add_argument('--webhook-delay-ms', type=float, default=200.0)
+    parser.add_argument('--duplicate-webhook-rate', type=float, default=0.0,
+                        help="Probabilité de livrer deux fois un même webhook")
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Latence moyenne ajoutée à chaque appel")
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help="Écart type de la latence")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probabilité d'une réponse 5xx")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Probabilité d'une réponse 429 aléatoire")
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help="Débit maximal en appels/seconde au-delà duquel répondre 429 (0 : illimité)")
+    parser.add_argument('--auto-complete', type=float, default=None,
+                        help="Payer automatiquement chaque session après ce délai en secondes")
+    parser.add_argument('--payment-failure-rate', type=float, default=0.0,
+                        help="Probabilité qu'un paiement simulé échoue")
+    parser.add_argument('--log-level', default='INFO')
+    options = parser.parse_args(argv)
+
+    logging.basicConfig(level=options.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    server = ThreadingHTTPServer((options.host, options.port), WaveRequestHandler)
+    server.daemon_threads = True
+    server.simulator = WaveSimulator(options)
+    _logger.info("Simulateur Wave à l'écoute sur http://%s:%s/v1", options.host, options.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
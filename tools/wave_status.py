@@ -0,0 +1,108 @@
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Valeurs connues des champs checkout_status et payment_status de Wave
+# ('' lorsque le champ est absent de la session)
+CHECKOUT_STATUSES = ('', 'open', 'complete', 'expired', 'failed', 'cancelled')
+PAYMENT_STATUSES = ('', 'processing', 'succeeded', 'failed', 'cancelled', 'refunded')
+
+
+def _derive_status(checkout_status, payment_status):
+    """Règles de correspondance, par ordre de priorité"""
+    if payment_status == 'refunded':
+        return 'refunded'
+    if checkout_status == 'complete' and payment_status == 'succeeded':
+        return 'completed'
+    if checkout_status == 'failed' or payment_status == 'failed':
+        return 'failed'
+    if checkout_status == 'cancelled' or payment_status == 'cancelled':
+        return 'cancelled'
+    if checkout_status == 'expired':
+        return 'expired'
+    return 'pending'
+
+
+# Table précalculée (checkout_status, payment_status) -> statut Odoo
+STATUS_TABLE = {
+    (checkout_status, payment_status): _derive_status(checkout_status, payment_status)
+    for checkout_status in CHECKOUT_STATUSES
+    for payment_status in PAYMENT_STATUSES
+}
+
+# Transitions autorisées depuis chaque statut Odoo. Un échec ou une annulation
+# de paiement laisse la session Wave ouverte : le client peut encore payer.
+# Une transaction expirée localement peut encore être complétée par Wave.
+ALLOWED_TRANSITIONS = {
+    'pending': {'completed', 'failed', 'cancelled', 'expired'},
+    'failed': {'pending', 'completed', 'cancelled', 'expired'},
+    'cancelled': {'pending', 'completed', 'failed', 'expired'},
+    'expired': {'completed'},
+    'completed': {'refunded'},
+    'refunded': set(),
+}
+
+# Statuts définitifs, dont seul un remboursement peut encore sortir. Les
+# transactions échouées, annulées ou expirées n'en font pas partie : Wave
+# peut encore les compléter (voir ALLOWED_TRANSITIONS), elles restent donc
+# dans la table active pour que webhooks et rafraîchissements les retrouvent.
+TERMINAL_STATUSES = tuple(
+    status for status, exits in ALLOWED_TRANSITIONS.items() if exits <= {'refunded'}
+)
+
+
+def raw_statuses(session_data):
+    """(checkout_status, payment_status) d'une session Wave, en minuscules ('' si absent ou nul)"""
+    return (
+        (session_data.get('checkout_status') or '').lower(),
+        (session_data.get('payment_status') or '').lower(),
+    )
+
+
+def map_status(checkout_status, payment_status):
+    """Statut Odoo correspondant aux statuts de checkout et de paiement Wave"""
+    key = ((checkout_status or '').lower(), (payment_status or '').lower())
+    status = STATUS_TABLE.get(key)
+    if status is None:
+        status = _derive_status(*key)
+    return status
+
+
+def session_status(session_data):
+    """Statut Odoo d'une session Wave"""
+    return map_status(*raw_statuses(session_data))
+
+
+def can_transition(current_status, new_status):
+    """Indiquer si une transaction peut passer de current_status à new_status"""
+    return current_status == new_status or new_status in ALLOWED_TRANSITIONS.get(current_status, ())
+
+
+def classify_batch(items):
+    """Classer un lot de changements de statut.
+
+    ``items`` est un itérable de (clé, statut actuel, statut cible). Retourne
+    ({statut cible: [clés]}, {clé: statut cible refusé}) ; les éléments dont
+    le statut ne change pas n'apparaissent dans aucun des deux.
+    """
+    changes = {}
+    rejected = {}
+    for key, current_status, new_status in items:
+        if current_status == new_status:
+            continue
+        if new_status in ALLOWED_TRANSITIONS.get(current_status, ()):
+            changes.setdefault(new_status, []).append(key)
+        else:
+            rejected[key] = new_status
+    if rejected:
+        _logger.info(f"{len(rejected)} transition(s) de statut Wave refusée(s)")
+    return changes, rejected
+
+
+def classify_sessions(items):
+    """Classer un lot de sessions Wave : ``items`` est un itérable de (clé, statut actuel, session)"""
+    return classify_batch(
+        (key, current_status, session_status(session_data))
+        for key, current_status, session_data in items
+    )